@@ -8,22 +8,33 @@ This is the actual model with scheduling and steps for
 """
 
 #import packages
-from individual import *
-from community import *
-from decisions import *
-from hh_class import *
-import random
-import math
+from individual import Individual
+from community import origin
+from hh_class import Household
+from agent_store import EMPLOYMENT_CODES, code_of, individual_store, household_store
+from decisions import get_decision
+from vector_engine import vector_land, vector_work, vector_decide, pick_migrants
+from population import bulk_populate
+from labor_market import sorted_double_auction
+from streams import model_streams
+from profiling import phase_profiler
+from summary import summary_recorder
+from network import make_network
+from demography import DEMOGRAPHY, population_dynamics
 import numpy as np
 import pandas as pd
 
 #initialize model
 class ABM_Model:
-    def __init__(self, ticks, N_hh, N_ind, decision, mig_util, mig_threshold, wealth_factor, ag_factor, comm_scale, shock_method, jobs_avail):
+    def __init__(self, ticks, N_hh, N_ind, decision, mig_util, mig_threshold, wealth_factor, ag_factor, comm_scale, shock_method, jobs_avail, engine='agent', bulk_init=True, auction='random', recorder=None, seed=None, instrument=False, profile_ticks=None, profiler='cprofile',
+                 network=None, network_degree=10, network_effect=0, validate_cache=False,
+                 demography=None):
         self.decision = decision #set decision type
+        get_decision(decision) #unknown decision methods fail here rather than mid run
         self.mig_util = mig_util #utility to migrate
         self.mig_threshold = mig_threshold #threshold to migrate
         #self.network_structure = network_structure
+        self.network_effect = network_effect #utility per neighbor household that sent a migrant
         self.num_hh = N_hh #households
         self.num_individuals = N_ind #number of individuals
         init_time = 0 #init ticks to 0 
@@ -35,41 +46,86 @@ class ABM_Model:
         self.comm_scale = comm_scale #scale (% community) impacted by an environmental shock
         self.shock_method = shock_method #this can be "shock" or "slow_onset"
         self.jobs_avail = jobs_avail #number of non_ag jobs in community 
+        self.job_adjustment = 0 #jobs gained/lost through flows with other communities
+        self.engine = engine #"agent" steps agents one at a time, "vector" steps whole columns
+        self.auction = auction #"random" double auction or "sorted" book clearing
+        self.set_seed(seed) #per model random streams
 
         #create community and initialize opportunities
-        self.origin_comm = origin(self.num_hh, self.jobs_avail, self.comm_scale)
+        self.origin_comm = origin(self.num_hh, self.jobs_avail, self.comm_scale, self.streams['community'])
 
         #for storing data
+        if recorder == 'summary': #per tick aggregates only, no household panel
+            recorder = summary_recorder()
+        self.recorder = recorder #optional tick_recorder, replaces data_set concatenation
         self.data_set = pd.DataFrame()
         self.last = pd.DataFrame()
         self.got_job = 0 #tracks successful job in labor market
+        self.auction_stats = {} #match counts and rounds of the last auction
+        #optional per phase timings and counters, None costs nothing
+        self.profiler = phase_profiler(profile_ticks, profiler) if instrument else None
 
-        #create individuals
-        self.individual_set = pd.DataFrame()
-        for i in range(self.num_individuals):
-            ind = Individual(self.ag_factor)
-            row = pd.DataFrame({'ind': [ind], 'id': [ind.unique_id],
-                                'age': [ind.age], 'hh': [ind.hh],
-                               'gender': [ind.gender]})
-            self.individual_set = pd.concat([self.individual_set, row])
-
-        # Create households
-        self.hh_set = pd.DataFrame() #empty list to store agents created
-        for i in range(self.num_hh):
-            a = Household(self.wealth_factor, self.ag_factor)
-            a.gather_members(self.individual_set)
-            a.assign_head(self.individual_set)
-            #a.set_network()
-            row = pd.DataFrame({'household': [a], 'hh_id': [a.unique_id],
-                                            'wtp': [a.wtp],
-                                           'wta': [a.wta]})
-            self.hh_set = pd.concat([self.hh_set, row])
+        #create individuals (columnar store, O(1) lookup by id)
+        self.individual_set = individual_store(self.num_individuals, self.streams['individuals'])
+        self.hh_set = household_store(self.num_hh, self.streams['households']) #store for households created
+        #check incrementally updated household aggregates against a full recompute each tick
+        self.individual_set.validate_cache = validate_cache
+        if bulk_init: #draw everyone and assign households in one vectorized pass
+            bulk_populate(self.individual_set, self.hh_set, self.num_individuals,
+                          self.num_hh, self.wealth_factor, self.ag_factor)
+        else:
+            for i in range(self.num_individuals):
+                Individual(self.ag_factor, self.individual_set)
+
+            # Create households
+            for i in range(self.num_hh):
+                a = Household(self.wealth_factor, self.ag_factor, self.hh_set)
+                a.gather_members(self.individual_set)
+                a.assign_head(self.individual_set)
+
+        #household social network, "random", "small_world", "community" or an hh_network
+        if isinstance(network, str):
+            network = make_network(network, len(self.hh_set), network_degree, self.streams['network'])
+        self.hh_set.network = network
+
+        #births, deaths and household formation each tick_up, True or a dict of DEMOGRAPHY rates
+        self.demography = None
+        if demography:
+            rates = dict(demography) if isinstance(demography, dict) else {}
+            headroom = rates.pop('headroom', DEMOGRAPHY['headroom'])
+            self.demography = population_dynamics(self.streams['demography'], **rates)
+            #room for growth up front, freed rows are reused before the stores grow
+            self.individual_set.reserve(int(headroom * len(self.individual_set)))
+            self.hh_set.reserve(int(headroom * len(self.hh_set)))
+
+    def set_seed(self, seed): #(re)build random streams and hand them to components
+        self.seed_seq, self.streams = model_streams(seed)
+        self.rng = self.streams['init']
+        for stream, part in [('community', 'origin_comm'), ('households', 'hh_set'),
+                             ('individuals', 'individual_set'), ('demography', 'demography')]:
+            if getattr(self, part, None) is not None:
+                getattr(self, part).rng = self.streams[stream]
+
+    def spawn(self, n): #n independent child generators from this model's seed
+        return [np.random.default_rng(s) for s in self.seed_seq.spawn(n)]
 
     def model_step(self): #model step does each
+        if self.profiler is not None:
+            self.profiler.step(self)
+            return
+        self.step_shock()
+        self.step_land()
+        self.step_work()
+        #double auction at model level 
+        self.double_auction()
+        self.step_decide()
 
+    def step_shock(self):
+        if self.engine != "vector":
             #random schedule each time
-        random_sched_hh = np.random.permutation(range(1, self.num_hh+ 1))
-        random_sched_ind = np.random.permutation(range(1, self.num_individuals+ 1))
+            sched = self.streams['schedule']
+            self.random_sched_hh = sched.permutation(self.hh_set.id[self.hh_set.live_rows()])
+            self.random_sched_ind = sched.permutation(self.individual_set.id[self.individual_set.live_rows()])
 
             #environmental shock in origin
         if self.shock_method == "shock":
@@ -77,137 +133,204 @@ class ABM_Model:
         else: 
             self.ag_factor = self.ag_factor * 0.95 #5% decrease in productivitiy each step 
 
+    def step_land(self):
+        if self.engine == "vector":
+            vector_land(self)
+            return
             #households need to check land
-        for i in random_sched_hh: #these are the steps at each tick for hh
-            agent_var = self.hh_set[self.hh_set.hh_id == i].household
-            agent_var[0].check_land(self.origin_comm, self.comm_scale)
-            agent_var[0].hire_employees()
+        for i in self.random_sched_hh: #these are the steps at each tick for hh
+            agent_var = self.hh_set.get(i)
+            agent_var.check_land(self.origin_comm, self.comm_scale)
+            agent_var.hire_employees()
 
+    def step_work(self):
+        if self.engine == "vector":
+            vector_work(self)
+            return
             #individuals look for work
-        for j in random_sched_ind: #steps for individuals
-            ind_var = self.individual_set[self.individual_set.id == j].ind
-            ind_var[0].check_eligibility()
-            ind_var[0].find_work(self.hh_set, self.mig_util)
-
-        #double auction at model level 
-        self.double_auction()
+        for j in self.random_sched_ind: #steps for individuals
+            ind_var = self.individual_set.get(j)
+            ind_var.check_eligibility()
+            ind_var.find_work(self.hh_set, self.mig_util)
+        self.individual_set.touch(eligible=True) #everyone was updated
 
+    def step_decide(self):
+        if self.engine == "vector":
+            vector_decide(self)
+            return
             #households decide to send a migrant or not and update wealth
-        for i in random_sched_hh: #these are the steps at each tick for hh
-            agent_var = self.hh_set[self.hh_set.hh_id == i].household
-            #agent_var.check_network()
-            agent_var[0].sum_utility(self.individual_set)
-            agent_var[0].migrate(self.decision, self.individual_set, self.mig_util, self.mig_threshold)
-            agent_var[0].update_wealth(self.individual_set)
+        self.update_network()
+        members = self.individual_set.members()
+        members.refresh() #salary sums and eligible members
+        #one candidate migrant per household, drawn for all households at once
+        candidates = np.full(len(members.offsets), -1, dtype=np.int64)
+        hh_ids, rows = pick_migrants(members, self.individual_set.migrated, self.hh_set.rng)
+        candidates[hh_ids] = rows
+        for i in self.random_sched_hh: #these are the steps at each tick for hh
+            agent_var = self.hh_set.get(i)
+            agent_var.sum_utility(self.individual_set)
+            agent_var.migrate(self.decision, self.individual_set, self.mig_util, self.mig_threshold,
+                              self.network_effect, candidates[i] if i < len(candidates) else -1)
+            agent_var.update_wealth(self.individual_set)
+
 
+    def run(self, monitor=None): #run the remaining ticks, or until monitor (convergence.py) says stop
+        while self.tick < self.ticks:
+            self.model_step()
+            self.data_collect()
+            if monitor is not None and monitor.update(self):
+                return self.results()
+            self.tick_up()
+        if monitor is not None:
+            monitor.finish()
+        return self.results()
+
+    def update_network(self): #count neighbor households that have sent a migrant
+        net = self.hh_set.network
+        if net is not None: #households founded since the network was drawn have no ties
+            self.hh_set.network_moves[:net.n] = net.neighbor_sum(self.hh_set.someone_migrated > 0)
 
     def double_auction(self): #gets people looking for work and hh employing
+        if self.auction == "sorted":
+            self.auction_stats = sorted_double_auction(self)
+            return self.auction_stats
         poss_employees = []  
         poss_employers = [] 
         still_looking_skilled = []
         still_looking_unskilled = []
         auctions = 3 # rounds w/ nothing changing 
         static_rounds = 0 
+        rng = self.streams['auction']
 
-        for i in self.individual_set['ind']:
-            if i.employment == "Looking":
-                poss_employees.append(i)
+        looking = self.individual_set.id[self.individual_set.employment == code_of(EMPLOYMENT_CODES, "Looking")]
+        poss_employees = [self.individual_set.get(i) for i in looking.tolist()]
         if poss_employees == None:
             return
-        for h in self.hh_set['household']:
-            if h.num_employees > 0:
-                poss_employers.append(h)
+        hiring = self.hh_set.id[self.hh_set.num_employees > 0]
+        poss_employers = [self.hh_set.get(h) for h in hiring.tolist()]
         if poss_employers == None:
             return 
 
         all_looking = len(poss_employees)
+        rounds = 0
+        matches = 0
+        hired = [] #rows whose salary changed, for the membership index
         
         while static_rounds < auctions and all_looking > 0: 
+            rounds += 1
             changed = False 
             for a in poss_employers: #households pick some people
                 if a.num_employees > 0: 
                     if a.num_employees > len(poss_employees):
-                        random_inds_look =  np.random.choice(poss_employees, len(poss_employees))
+                        random_inds_look =  rng.choice(len(poss_employees), len(poss_employees))
                     else:
-                        random_inds_look =  np.random.choice(poss_employees, a.num_employees)
+                        random_inds_look =  rng.choice(len(poss_employees), a.num_employees)
                     for random_ind in random_inds_look:
+                        random_ind = poss_employees[random_ind]
                         if random_ind.employment != "Looking":
                             pass 
                         elif a.wtp >= random_ind.wta:
                             a.employees.append(a)
                             a.num_employees = a.num_employees - 1
                             random_ind.salary = (random_ind.wta + a.wtp)/2
+                            hired.append(random_ind._row)
                             random_ind.employment = "OtherAg"
                             changed = True 
                             random_ind.employer = a.unique_id
-                            a.payments.append(random_ind.salary)
+                            a.payments += random_ind.salary
                             all_looking = all_looking - 1 
+                            matches += 1
                             self.got_job += 1 
-                            self.individual_set.loc[(self.individual_set.id == random_ind.unique_id), 'ind'] = random_ind
-                self.hh_set.loc[(self.hh_set.hh_id == a.unique_id), 'household'] = a
             if changed:
                 static_rounds = 0 
             else:
                 static_rounds += 1 
 
         #individuals may look for an unskilled or a skilled job within the community 
-        for i in self.individual_set['ind']:
-            if i.employment == "Looking":
-                my_hh = self.hh_set[self.hh_set['hh_id'] == i.hh]['household']
-                if my_hh[0].wealth > self.wealth_factor:
-                    still_looking_skilled.append(i)
-                else:
-                    still_looking_unskilled.append(i)
-        if still_looking_unskilled == None and still_looking_skilled == None:
-            return 
+        looking = self.individual_set.id[self.individual_set.employment == code_of(EMPLOYMENT_CODES, "Looking")]
+        for i in looking.tolist():
+            i = self.individual_set.get(i)
+            my_hh = self.hh_set.get(i.hh)
+            if my_hh.wealth > self.wealth_factor:
+                still_looking_skilled.append(i)
+            else:
+                still_looking_unskilled.append(i)
         if len(still_looking_unskilled) > self.origin_comm.avail_jobs / 2:
-            found_other_job_unskilled = random.sample(still_looking_unskilled, round(self.origin_comm.avail_jobs / 2))
+            found_other_job_unskilled = [still_looking_unskilled[k] for k in rng.choice(len(still_looking_unskilled), round(self.origin_comm.avail_jobs / 2), replace=False)]
         else:
             found_other_job_unskilled = still_looking_unskilled
 
         if len(still_looking_skilled) > self.origin_comm.avail_jobs / 2:
-            found_other_job_skilled = random.sample(still_looking_skilled, round(self.origin_comm.avail_jobs / 2))
+            found_other_job_skilled = [still_looking_skilled[k] for k in rng.choice(len(still_looking_skilled), round(self.origin_comm.avail_jobs / 2), replace=False)]
         else:
             found_other_job_skilled = still_looking_skilled
 
         for i in found_other_job_unskilled:
             i.employment = "OtherNonAg_Unskilled"
-            i.salary = 24000 * random.random() #some small number
-            self.individual_set.loc[(self.individual_set.id == i.unique_id), 'ind'] = i
+            i.salary = 24000 * rng.random() #some small number
 
         for i in found_other_job_skilled:
             i.employment = "OtherNonAg_Skilled"
-            i.salary = 50000 * random.random() #some greater number
-            self.individual_set.loc[(self.individual_set.id == i.unique_id), 'ind'] = i
+            i.salary = 50000 * rng.random() #some greater number
+        hired += [i._row for i in found_other_job_unskilled + found_other_job_skilled]
+        self.individual_set.touch(np.array(hired, dtype=np.int64))
+
+        self.auction_stats = {'auction': 'random', 'looking': len(poss_employees),
+                              'employers': len(poss_employers), 'matches': matches,
+                              'rounds': rounds, 'unskilled': len(found_other_job_unskilled),
+                              'skilled': len(found_other_job_skilled)}
+        return self.auction_stats
 
                    
     def data_collect(self): #use this to collect model level data
+        if self.profiler is not None:
+            self.profiler.run(self.tick, 'data_collect', self.collect)
+        else:
+            self.collect()
+
+    def collect(self):
+        if self.recorder is not None:
+            self.recorder.record(self)
+            return
     #household level data
-        for j in range(1, self.num_hh + 1):
-            hh_var = self.hh_set[self.hh_set.hh_id == j].household
-            hh = hh_var[0]
-            row = pd.DataFrame({'hh_id': [hh.unique_id], 'migrations': [hh.someone_migrated],
-                                'wealth': [hh.wealth], 'num_shocked':[hh.num_shocked], 
-                                'wtp': [hh.wtp], 'wta': [hh.wta], 'found_work': [self.got_job], 
-                                'tick': [self.tick], 'ag_fac': [self.ag_factor],
-                                'mig_util':[self.mig_util], 'mig_threshold':[self.mig_threshold],
-                                'comm_scale':self.comm_scale})
-            self.data_set = pd.concat([self.data_set, row])
-
-
-        self.last = self.data_set[self.data_set['tick'] == self.tick]
+        hh = self.hh_set #read straight from the household columns
+        live = hh.live_rows() #households that exist, see demography
+        rows = pd.DataFrame({'hh_id': hh.id[live].copy(), 'migrations': hh.someone_migrated[live].copy(),
+                             'wealth': hh.wealth[live].copy(), 'num_shocked': hh.num_shocked[live].copy(),
+                             'wtp': hh.wtp[live].copy(), 'wta': hh.wta[live].copy(), 'found_work': self.got_job,
+                             'tick': self.tick, 'ag_fac': self.ag_factor,
+                             'mig_util': self.mig_util, 'mig_threshold': self.mig_threshold,
+                             'comm_scale': self.comm_scale})
+        self.data_set = pd.concat([self.data_set, rows])
+
+
+        self.last = rows
         mig_sum = self.last.iloc[:,1].sum(axis=0)
         row = pd.DataFrame({'tick': [self.tick], 'total_mig': [mig_sum]})
         self.migrations = pd.concat([self.migrations, row])
 
+    def profile_table(self): #per tick phase timings and counters (instrument=True)
+        if self.profiler is None:
+            raise RuntimeError("model was not built with instrument=True")
+        return self.profiler.table()
+
+    def results(self): #(household data, migrations per tick) for either output mode
+        if self.recorder is not None:
+            return self.recorder.data_set, self.recorder.migrations
+        return self.data_set, self.migrations
+
     #tick up model 
     def tick_up(self):
         #tick and reset key values
         self.tick += 1
         self.origin_comm.impacted = False
-        self.origin_comm.avail_jobs = self.jobs_avail 
+        self.origin_comm.avail_jobs = max(self.jobs_avail + self.job_adjustment, 0)
+        self.hh_set.shocks = self.hh_set.new_migrants = 0
 
-        #age everyone 1 year
-        for j in range(1, self.num_individuals + 1):
-            ind_var = self.individual_set[self.individual_set.id == j].ind
-            ind_var[0].age_up()
+        #age everyone 1 year (Individual.age_up over the columns)
+        #salaries are not reset, find_work sets them for everyone it rechecks
+        ind = self.individual_set
+        ind.age[ind.alive] += 1
+        ind.mark_recheck(np.flatnonzero((ind.age >= 14) & (ind.age < 15))) #now old enough to work
+        if self.demography is not None:
+            self.demography.step(self)
@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Working definition of columnar agent storage for ABM
+ of environmental migration
+
+@author: kelseabest
+"""
+
+#import packages
+import numpy as np
+import pandas as pd
+
+#codes for string valued fields stored as small ints
+EMPLOYMENT_CODES = [None, 'None', 'SelfAg', 'Looking', 'OtherAg',
+                    'OtherNonAg_Unskilled', 'OtherNonAg_Skilled']
+GENDER_CODES = ['M', 'F']
+
+def code_of(codes, value):
+    #lookup code of a string value, e.g. code_of(EMPLOYMENT_CODES, 'Looking')
+    return codes.index(value)
+
+def segment_sum(values, offsets):
+    #sum values over CSR segments [offsets[k], offsets[k+1]), empty segments give 0
+    out = np.zeros(len(offsets) - 1, dtype=np.result_type(values.dtype, np.int64))
+    starts = offsets[:-1]
+    nonempty = offsets[1:] > starts
+    if nonempty.any():
+        out[nonempty] = np.add.reduceat(values.astype(out.dtype, copy=False), starts[nonempty])
+    return out
+
+#descriptor so agent objects read and write through their store row
+class column :
+    def __init__(self, codes=None, nullable=False, field=None):
+        self.codes = codes #list mapping int code -> value
+        self.nullable = nullable #0 is stored for None (ids start at 1)
+        self.name = field #store column, defaults to the attribute name
+    def __set_name__(self, owner, name):
+        if self.name is None:
+            self.name = name
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        value = obj._store.data[self.name][obj._row].item()
+        if self.codes is not None:
+            return self.codes[value]
+        if self.nullable and value == 0:
+            return None
+        return value
+    def __set__(self, obj, value):
+        if self.codes is not None:
+            value = self.codes.index(value)
+        elif self.nullable and value is None:
+            value = 0
+        obj._store.data[self.name][obj._row] = value
+        if self.name in obj._store.index_fields:
+            obj._store.version += 1
+
+#struct-of-arrays population, one row per agent
+class agent_store :
+    schema = {} #column name -> (dtype, default)
+    agent_class = None #view class handed out by get()
+    index_fields = () #columns whose writes invalidate derived indexes
+    id_base = 0 #row_of[k] is the row of id id_base + k, ids up to id_base are gone
+
+    def __init__(self, capacity=16, rng=None):
+        self.rng = rng if rng is not None else np.random.default_rng() #stream for these agents
+        self.version = 0 #bumped when an index field changes
+        self.size = 0
+        self.capacity = max(int(capacity), 16)
+        self.next_uid = 1
+        self.data = {name: np.full(self.capacity, default, dtype=dtype)
+                     for name, (dtype, default) in self.schema.items()}
+        self.data['id'] = np.zeros(self.capacity, dtype=np.int64)
+        self.row_of = np.full(self.capacity + 1, -1, dtype=np.int64) #id -> row, slot 0 always -1
+        self.objects = [None] * self.capacity #cached agent views
+        self.free = [] #rows of removed agents (id 0), reused before appending
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, name): #live column view, e.g. individual_set['hh']
+        return self.data[name][:self.size]
+
+    def __getattr__(self, name):
+        data = self.__dict__.get('data')
+        if data is not None and name in data:
+            return data[name][:self.size]
+        raise AttributeError(name)
+
+    def _grow(self, needed, exact=False):
+        new_cap = needed if exact else max(needed, self.capacity * 2)
+        for name, arr in self.data.items():
+            default = self.schema[name][1] if name in self.schema else 0
+            new = np.full(new_cap, default, dtype=arr.dtype)
+            new[:self.capacity] = arr
+            self.data[name] = new
+        self.objects.extend([None] * (new_cap - self.capacity))
+        self.capacity = new_cap
+
+    def _grow_ids(self, new_id, max_id):
+        #make ids new_id..max_id fit, ids are never reused so before growing the
+        #map drops the ids below the oldest living (or new) agent's; under churn
+        #it spans a bounded window
+        if max_id - self.id_base < len(self.row_of):
+            return
+        live = np.flatnonzero(self.row_of >= 0)
+        first = new_id - self.id_base #slot of the oldest living or new id
+        if len(live):
+            first = min(first, live[0])
+        kept = self.row_of[first:]
+        needed = max_id - (self.id_base + first - 1) + 1
+        size = len(self.row_of) if 2 * needed <= len(self.row_of) else max(needed, 2 * len(self.row_of))
+        new = np.full(size, -1, dtype=np.int64)
+        new[1:1 + len(kept)] = kept
+        self.row_of = new
+        self.id_base += first - 1
+
+    def reserve(self, capacity): #preallocate rows so later adds never reallocate
+        if capacity > self.capacity:
+            self._grow(capacity, exact=True)
+
+    def _take_rows(self, n): #n rows for new agents, freed rows first
+        reused = self.free[len(self.free) - min(n, len(self.free)):]
+        del self.free[len(self.free) - len(reused):]
+        for name, (dtype, default) in self.schema.items():
+            self.data[name][reused] = default #remove left alive False
+        extra = n - len(reused)
+        if self.size + extra > self.capacity:
+            self._grow(self.size + extra)
+        rows = np.concatenate((np.array(reused, dtype=np.int64),
+                               np.arange(self.size, self.size + extra)))
+        self.size += extra
+        return rows
+
+    def add(self, **values): #add one agent, returns (id, row)
+        row = self._take_rows(1)[0].item()
+        uid = self.next_uid
+        self.next_uid += 1
+        self._grow_ids(uid, uid)
+        self.data['id'][row] = uid
+        self.row_of[uid - self.id_base] = row
+        for name, value in values.items():
+            self.data[name][row] = value
+        self.version += 1
+        return uid, row
+
+    def add_many(self, n, **values): #add n agents at once, returns their rows
+        rows = self._take_rows(n)
+        uids = np.arange(self.next_uid, self.next_uid + n)
+        self.next_uid += n
+        self._grow_ids(uids[0] if n else self.next_uid, self.next_uid)
+        self.data['id'][rows] = uids
+        self.row_of[uids - self.id_base] = rows
+        for name, value in values.items():
+            self.data[name][rows] = value
+        self.version += 1
+        return rows
+
+    def remove(self, rows): #free agents' rows for reuse, their ids stop resolving
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return
+        self.row_of[self.data['id'][rows] - self.id_base] = -1
+        for name, (dtype, default) in self.schema.items():
+            self.data[name][rows] = default
+        self.data['id'][rows] = 0
+        if 'alive' in self.data:
+            self.data['alive'][rows] = False
+        for row in rows.tolist():
+            self.objects[row] = None
+        self.free.extend(rows.tolist())
+        self.version += 1
+
+    def live_rows(self): #rows holding agents, a slice while no row is free
+        if not self.free:
+            return slice(None)
+        return np.flatnonzero(self.data['id'][:self.size] != 0)
+
+    @property
+    def n_alive(self):
+        return self.size - len(self.free)
+
+    def rows(self, ids): #vectorized id -> row lookup, -1 for ids that are gone (and 0)
+        return self.row_of[np.maximum(np.asarray(ids, dtype=np.int64) - self.id_base, 0)]
+
+    def get(self, uid): #agent object for an id in O(1)
+        if uid is None:
+            return None
+        slot = uid - self.id_base
+        if slot <= 0 or slot >= len(self.row_of) or self.row_of[slot] < 0:
+            return None
+        row = self.row_of[slot]
+        obj = self.objects[row]
+        if obj is None:
+            obj = self.agent_class.__new__(self.agent_class)
+            obj._store = self
+            obj._row = row
+            obj._init_extra()
+            self.objects[row] = obj
+        return obj
+
+    def to_frame(self): #flat DataFrame copy for analysis, freed rows left out
+        rows = self.live_rows()
+        return pd.DataFrame({name: arr[:self.size][rows].copy()
+                             for name, arr in self.data.items()})
+
+#household -> members index (CSR over individual rows, keyed by household id,
+#so its per household arrays span every household id issued so far)
+class member_index :
+    def __init__(self, individual_set):
+        self.individual_set = individual_set
+        hh = individual_set.hh
+        self.order = np.argsort(hh, kind='stable') #individual rows grouped by hh id
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(hh)))).astype(np.int64)
+        self.salary_sum = np.zeros(len(self.offsets) - 1)
+        self.eligible_offsets = np.zeros(len(self.offsets), dtype=np.int64)
+        self.eligible_rows = np.empty(0, dtype=np.int64)
+        self.refreshed = False #first refresh computes everything
+        self.dirty = None #mask of household ids changed since the last take_dirty, None for all
+
+    def rows_of(self, hh_id): #individual rows belonging to a household
+        if hh_id is None or hh_id + 1 >= len(self.offsets):
+            return self.order[:0]
+        return self.order[self.offsets[hh_id]:self.offsets[hh_id + 1]]
+
+    def segment_sum(self, values): #per household id sum of an individual column
+        return segment_sum(values[self.order], self.offsets)
+
+    def _positions(self, hh_ids): #positions in order of the members of hh_ids, and CSR offsets
+        starts = self.offsets[hh_ids]
+        lengths = self.offsets[hh_ids + 1] - starts
+        offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+        return np.arange(offsets[-1]) + np.repeat(starts - offsets[:-1], lengths), offsets
+
+    def segment_sum_of(self, hh_ids, values): #segment_sum for some household ids only
+        pos, offsets = self._positions(hh_ids)
+        return segment_sum(values[self.order[pos]], offsets)
+
+    def rows_of_many(self, hh_ids): #individual rows of several households
+        hh_ids = hh_ids[hh_ids + 1 < len(self.offsets)]
+        return self.order[self._positions(hh_ids)[0]]
+
+    def _compute(self): #everything from scratch
+        ind = self.individual_set
+        self.salary_sum = self.segment_sum(ind.salary)
+        self._eligible()
+        self.refreshed = True
+
+    def _eligible(self): #CSR of members that could migrate
+        ind = self.individual_set
+        mask = (ind.can_migrate & ~ind.migrated)[self.order]
+        counts = segment_sum(mask, self.offsets)
+        self.eligible_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.eligible_rows = self.order[mask]
+
+    def _households(self, rows): #mask over household ids of rows, None for all
+        if rows is None:
+            return np.ones(len(self.salary_sum), dtype=bool)
+        mask = np.zeros(len(self.salary_sum), dtype=bool)
+        mask[self.individual_set.hh[rows]] = True
+        return mask
+
+    def _update_eligible(self, hh_ids):
+        #recompute the eligible segments of hh_ids, move the others over unchanged
+        ind = self.individual_set
+        pos, offsets = self._positions(hh_ids)
+        rows = self.order[pos]
+        mask = ind.can_migrate[rows] & ~ind.migrated[rows]
+        counts = np.diff(self.eligible_offsets)
+        counts[hh_ids] = segment_sum(mask, offsets)
+        new_offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        new_rows = np.empty(new_offsets[-1], dtype=np.int64)
+        old_hh = np.repeat(np.arange(len(counts)), np.diff(self.eligible_offsets))
+        keep = np.ones(len(counts), dtype=bool)
+        keep[hh_ids] = False
+        kept = np.flatnonzero(keep[old_hh])
+        shift = new_offsets[:-1] - self.eligible_offsets[:-1]
+        new_rows[kept + shift[old_hh[kept]]] = self.eligible_rows[kept]
+        counts = counts[hh_ids]
+        starts = np.cumsum(counts) - counts
+        new_rows[np.repeat(new_offsets[hh_ids] - starts, counts) + np.arange(counts.sum())] = rows[mask]
+        self.eligible_offsets, self.eligible_rows = new_offsets, new_rows
+
+    def refresh(self): #bring cached per household aggregates up to date
+        ind = self.individual_set
+        touched, touched_eligible = ind.take_touched()
+        if not self.refreshed:
+            self._compute()
+            return
+        #only households of members touched (individual_store.touch) since the last refresh
+        changed = self._households(touched)
+        hh_ids = np.flatnonzero(changed)
+        if 2 * len(hh_ids) > len(changed): #cheaper in one pass, same sums
+            self.salary_sum = self.segment_sum(ind.salary)
+        else:
+            self.salary_sum[hh_ids] = self.segment_sum_of(hh_ids, ind.salary)
+        if self.dirty is not None:
+            changed[0] = False #individuals without a household
+            self.dirty |= changed
+        if touched_eligible is None:
+            self._eligible()
+        elif len(touched_eligible):
+            self._update_eligible(np.flatnonzero(self._households(touched_eligible)))
+        if ind.validate_cache:
+            self.validate()
+
+    def take_dirty(self, hh_set): #household rows changed since the last call, then clears
+        if self.dirty is None:
+            rows = np.arange(len(hh_set))
+        else:
+            rows = hh_set.rows(np.flatnonzero(self.dirty))
+        self.dirty = np.zeros(len(self.salary_sum), dtype=bool)
+        return rows
+
+    def validate(self, total_utility=None, hh_ids=None, secure=None, threshold=None):
+        #cross check the cached aggregates (and household columns derived
+        #from them) against a full recompute
+        full = member_index(self.individual_set)
+        full._compute()
+        if not np.allclose(self.salary_sum, full.salary_sum):
+            bad = np.flatnonzero(~np.isclose(self.salary_sum, full.salary_sum))
+            raise RuntimeError("cached salary sums out of date for households %s" % bad[:10])
+        if not (np.array_equal(self.eligible_offsets, full.eligible_offsets)
+                and np.array_equal(np.sort(self.eligible_rows), np.sort(full.eligible_rows))):
+            raise RuntimeError("cached eligible members out of date")
+        if total_utility is not None:
+            expected = np.zeros(len(hh_ids))
+            inside = hh_ids < len(full.salary_sum)
+            expected[inside] = full.salary_sum[hh_ids[inside]]
+            if not np.allclose(total_utility, expected):
+                bad = hh_ids[~np.isclose(total_utility, expected)]
+                raise RuntimeError("total_utility out of date for households %s" % bad[:10])
+            if secure is not None and not np.array_equal(secure, expected >= threshold):
+                bad = hh_ids[secure != (expected >= threshold)]
+                raise RuntimeError("secure out of date for households %s" % bad[:10])
+
+    def salary_of(self, hh_id):
+        if hh_id + 1 >= len(self.offsets):
+            return 0.0
+        return self.salary_sum[hh_id].item()
+
+    def eligible_of(self, hh_id): #rows that could migrate as of the last refresh
+        if hh_id + 1 >= len(self.eligible_offsets):
+            return self.eligible_rows[:0]
+        return self.eligible_rows[self.eligible_offsets[hh_id]:self.eligible_offsets[hh_id + 1]]
+
+    def moved(self, row, hh_id, old_salary): #keep aggregates right when members migrate
+        #the touch makes the next refresh mark the household dirty
+        np.add.at(self.salary_sum, hh_id, self.individual_set.salary[row] - old_salary)
+        self.individual_set.touch(np.atleast_1d(row), eligible=True)
+
+class individual_store(agent_store):
+    index_fields = ('hh',)
+    validate_cache = False #cross check incremental updates against a full recompute
+    schema = {
+        'age': (np.float64, 0.0),
+        'gender': (np.int8, 0),
+        'hh': (np.int64, 0),
+        'employment': (np.int8, 0),
+        'salary': (np.float64, 0.0),
+        'employer': (np.int64, 0),
+        'can_migrate': (np.bool_, False),
+        'head': (np.bool_, False),
+        'migrated': (np.bool_, False),
+        'ag_factor': (np.float64, 0.0),
+        'alive': (np.bool_, True),
+        'wta': (np.float64, 0.0),
+    }
+
+    def __init__(self, capacity=16, rng=None):
+        super().__init__(capacity, rng)
+        #dirty tracking, marked where the changes happen
+        self.touched = [] #rows whose salary changed since the last refresh, None for all
+        self.touched_eligible = [] #rows whose can_migrate or migrated changed, None for all
+        self.recheck = None #rows whose work inputs changed (vector find_work), None for all
+        self.recheck_hh = [] #household ids whose members' work inputs changed
+
+    def touch(self, rows=None, eligible=False):
+        #rows whose salary (and with eligible, can_migrate or migrated) changed,
+        #None for everyone; their households are recomputed by the next refresh
+        for name in ['touched', 'touched_eligible'] if eligible else ['touched']:
+            if rows is None:
+                setattr(self, name, None)
+            elif getattr(self, name) is not None:
+                getattr(self, name).append(np.asarray(rows, dtype=np.int64))
+
+    def take_touched(self): #(salary rows, eligibility rows), each None for all, then clears
+        out = []
+        for rows in [self.touched, self.touched_eligible]:
+            if rows is not None:
+                rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+            out.append(rows)
+        self.touched, self.touched_eligible = [], []
+        return out
+
+    def mark_recheck(self, rows=None, hh_ids=None):
+        #individuals (rows, or all members of hh_ids) whose work inputs changed,
+        #no arguments for everyone
+        if rows is None and hh_ids is None:
+            self.recheck = None
+        if self.recheck is None:
+            return
+        if rows is not None:
+            self.recheck.append(np.asarray(rows, dtype=np.int64))
+        if hh_ids is not None:
+            self.recheck_hh.append(np.asarray(hh_ids, dtype=np.int64))
+
+    def take_recheck(self): #distinct rows to recheck (None for all), then clears
+        rows = self.recheck
+        if rows is not None:
+            if self.recheck_hh:
+                rows = rows + [self.members().rows_of_many(np.concatenate(self.recheck_hh))]
+            mask = np.zeros(len(self), dtype=bool)
+            for r in rows:
+                mask[r] = True
+            rows = np.flatnonzero(mask)
+        self.recheck, self.recheck_hh = [], []
+        return rows
+
+    def members(self): #membership index, rebuilt when membership changes (with demography every tick)
+        index = self.__dict__.get('_members')
+        if index is None or self._members_version != self.version:
+            index = member_index(self)
+            index.refresh()
+            self._members = index
+            self._members_version = self.version
+        return index
+
+class household_store(agent_store):
+    network = None #optional hh_network over household rows
+    #counts of this tick's events, reset by ABM_Model.tick_up
+    shocks = 0 #households whose land was hit
+    new_migrants = 0 #migrants sent
+    schema = {
+        'wealth': (np.float64, 0.0),
+        'hh_size': (np.int64, 0),
+        'head': (np.int64, 0),
+        'land_owned': (np.float64, 0.0),
+        'secure': (np.bool_, True),
+        'wellbeing_threshold': (np.float64, 0.0),
+        'network_moves': (np.int64, 0),
+        'someone_migrated': (np.int64, 0),
+        'land_impacted': (np.bool_, False),
+        'wta': (np.float64, 0.0),
+        'wtp': (np.float64, 0.0),
+        'num_employees': (np.int64, 0),
+        'payments': (np.float64, 0.0),
+        'expenses': (np.float64, 0.0),
+        'total_utility': (np.float64, 0.0),
+        'total_util_w_migrant': (np.float64, 0.0),
+        'num_shocked': (np.int64, 0),
+        'ag_factor': (np.float64, 0.0),
+        'land_prod': (np.float64, 0.0),
+    }
+
+    def remove(self, rows): #freed rows also lose their ties, households founded there start without any
+        super().remove(rows)
+        if self.network is not None and len(rows):
+            self.network.drop(np.asarray(rows, dtype=np.int64))
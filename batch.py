@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replicate-axis batched simulation for ABM of environmental migration.
+R stochastic replicates of one parameter set live in one pair of agent
+ stores, laid out replicate-major so every column reshapes to a
+ (replicate x agent) array. Each phase of the vector engine then runs
+ once for all replicates; the community (shock, jobs) and the labor
+ market are kept per replicate.
+
+Example:
+    b = replicate_batch(32, 10, 100, 500, 'utility', 30000, 50000,
+                        200000, 300, 0.5, 'shock', 50, seed=1)
+    data_set, migrations = b.run()
+
+@author: kelseabest
+"""
+
+#import packages
+from agent_store import individual_store, household_store
+from population import bulk_populate
+from labor_market import clear_sorted_book, LOOKING, OTHER_AG, UNSKILLED, SKILLED
+from streams import model_streams
+from vector_engine import (hire_employees, check_eligibility, find_work, migrate,
+                           sum_utility, update_wealth, salary_of)
+import numpy as np
+import pandas as pd
+
+def check_land(hh, impacted, comm_scale):
+    #vector_engine.check_land with a per household impacted flag
+    hit = impacted & (hh.rng.random(len(hh)) < comm_scale)
+    hh.land_impacted[hit] = True
+    hh.num_shocked[hit] += 1
+    hh.shocks += int(hit.sum())
+    hh.wealth[hit] *= hh.rng.random(hit.sum())
+    hh.land_prod[hit] = 0
+
+def take_per_group(group, quota, rng):
+    #random subset of positions with at most quota[g] from each group g
+    order = np.lexsort((rng.random(len(group)), group))
+    sorted_group = group[order]
+    start = np.searchsorted(sorted_group, sorted_group, side='left')
+    keep = (np.arange(len(order)) - start) < quota[sorted_group]
+    return np.sort(order[keep])
+
+class replicate_batch :
+    def __init__(self, replicates, ticks, N_hh, N_ind, decision, mig_util, mig_threshold, wealth_factor, ag_factor, comm_scale, shock_method, jobs_avail, seed=None):
+        self.replicates = replicates #number of replicates stepped together
+        self.decision = decision
+        self.mig_util = mig_util
+        self.mig_threshold = mig_threshold
+        self.num_hh = N_hh #households per replicate
+        self.num_individuals = N_ind #individuals per replicate
+        self.tick = 0
+        self.ticks = ticks
+        self.wealth_factor = wealth_factor
+        self.ag_factor = ag_factor
+        self.comm_scale = comm_scale
+        self.shock_method = shock_method
+        self.jobs_avail = jobs_avail
+        self.seed_seq, self.streams = model_streams(seed)
+
+        #one community per replicate
+        self.impacted = np.zeros(replicates, dtype=bool)
+        self.avail_jobs = np.full(replicates, float(jobs_avail))
+        self.got_job = np.zeros(replicates, dtype=np.int64)
+
+        #replicate r starts from the same population as ABM_Model(seed=self.replicate_seed(r))
+        self.children = self.seed_seq.spawn(replicates)
+        self.individual_set = individual_store(replicates * N_ind, self.streams['individuals'])
+        self.hh_set = household_store(replicates * N_hh, self.streams['households'])
+        for r in range(replicates):
+            streams = model_streams(self.replicate_seed(r))[1]
+            self.individual_set.rng = streams['individuals']
+            self.hh_set.rng = streams['households']
+            bulk_populate(self.individual_set, self.hh_set, N_ind, N_hh, wealth_factor, ag_factor)
+        self.individual_set.rng = self.streams['individuals']
+        self.hh_set.rng = self.streams['households']
+        self.ind_rep = np.repeat(np.arange(replicates), N_ind) #replicate of each row
+        self.hh_rep = np.repeat(np.arange(replicates), N_hh)
+
+        self.frames = [] #per tick data_collect frames
+        self.mig_frames = []
+
+    def replicate_seed(self, r): #fresh copy of replicate r's SeedSequence (spawning mutates it)
+        child = self.children[r]
+        return np.random.SeedSequence(child.entropy, spawn_key=child.spawn_key)
+
+    def column(self, store, name): #(replicate x agent) view of a store column
+        store = getattr(self, store)
+        n = self.num_individuals if store is self.individual_set else self.num_hh
+        return store[name].reshape(self.replicates, n)
+
+    def model_step(self):
+        self.step_shock()
+        self.step_land()
+        self.step_work()
+        self.double_auction()
+        self.step_decide()
+
+    def step_shock(self): #every replicate's community draws its own shock
+        if self.shock_method == "shock":
+            hit = self.streams['community'].random(self.replicates) < 0.2
+            self.impacted |= hit
+            self.avail_jobs[hit] *= 1 - self.comm_scale
+        else:
+            self.ag_factor = self.ag_factor * 0.95 #5% decrease in productivitiy each step
+
+    def step_land(self):
+        check_land(self.hh_set, self.impacted[self.hh_rep], self.comm_scale)
+        hire_employees(self.hh_set)
+
+    def step_work(self):
+        check_eligibility(self.individual_set)
+        find_work(self.individual_set, self.hh_set, self.mig_util)
+
+    def double_auction(self):
+        #sorted book clearing within each replicate, then non-ag jobs per replicate
+        ind, hh = self.individual_set, self.hh_set
+        rng = self.streams['auction']
+        looking = np.flatnonzero(ind.employment == LOOKING)
+        employers = np.flatnonzero(hh.num_employees > 0)
+        w, e, rounds = clear_sorted_book(ind.wta[looking], hh.wtp[employers],
+                                         hh.num_employees[employers], rng,
+                                         self.ind_rep[looking], self.hh_rep[employers])
+        workers, emp_rows = looking[w], employers[e]
+        salary = (ind.wta[workers] + hh.wtp[emp_rows]) / 2
+        ind.salary[workers] = salary
+        ind.touch(workers)
+        ind.employment[workers] = OTHER_AG
+        ind.employer[workers] = hh.id[emp_rows]
+        np.subtract.at(hh.num_employees, emp_rows, 1)
+        np.add.at(hh.payments, emp_rows, salary)
+        self.got_job += np.bincount(self.ind_rep[workers], minlength=self.replicates)
+
+        looking = np.flatnonzero(ind.employment == LOOKING)
+        skilled = hh.wealth[hh.rows(ind.hh[looking])] > self.wealth_factor
+        quota = np.round(self.avail_jobs / 2).astype(np.int64)
+        for group, code, pay in [(looking[~skilled], UNSKILLED, 24000), #some small number
+                                 (looking[skilled], SKILLED, 50000)]: #some greater number
+            group = group[take_per_group(self.ind_rep[group], quota, rng)]
+            ind.employment[group] = code
+            ind.salary[group] = pay * rng.random(len(group))
+            ind.touch(group)
+
+    def step_decide(self): #sum utility, send migrants, update wealth
+        ind, hh = self.individual_set, self.hh_set
+        members = ind.members()
+        members.refresh()
+        sum_utility(hh, members)
+        migrate(ind, hh, members, self.decision, self.mig_util, self.mig_threshold)
+        update_wealth(hh, salary_of(members.salary_sum, hh.id))
+
+    def data_collect(self):
+        #ABM_Model.data_collect rows for every replicate, hh_id counted within the replicate
+        hh = self.hh_set
+        rows = pd.DataFrame({'replicate': self.hh_rep, 'hh_id': hh.id - self.hh_rep * self.num_hh,
+                             'migrations': hh.someone_migrated.copy(),
+                             'wealth': hh.wealth.copy(), 'num_shocked': hh.num_shocked.copy(),
+                             'wtp': hh.wtp.copy(), 'wta': hh.wta.copy(),
+                             'found_work': self.got_job[self.hh_rep],
+                             'tick': self.tick, 'ag_fac': self.ag_factor,
+                             'mig_util': self.mig_util, 'mig_threshold': self.mig_threshold,
+                             'comm_scale': self.comm_scale})
+        self.frames.append(rows)
+        total = self.column('hh_set', 'someone_migrated').sum(axis=1)
+        self.mig_frames.append(pd.DataFrame({'replicate': np.arange(self.replicates),
+                                             'tick': self.tick, 'total_mig': total}))
+
+    def results(self): #(household data, migrations per replicate and tick)
+        if not self.frames:
+            return pd.DataFrame(), pd.DataFrame()
+        return (pd.concat(self.frames, ignore_index=True),
+                pd.concat(self.mig_frames, ignore_index=True))
+
+    def replicate(self, r): #replicate r's outputs, as ABM_Model.results() would give them
+        data_set, migrations = self.results()
+        return (data_set[data_set.replicate == r].drop(columns='replicate'),
+                migrations[migrations.replicate == r].drop(columns='replicate'))
+
+    def tick_up(self):
+        self.tick += 1
+        self.impacted[:] = False
+        self.avail_jobs[:] = self.jobs_avail
+        self.hh_set.shocks = self.hh_set.new_migrants = 0
+        self.individual_set.age[:] += 1 #age everyone 1 year, find_work resets salaries
+
+    def run(self, ticks=None):
+        for t in range(self.ticks if ticks is None else ticks):
+            self.model_step()
+            self.data_collect()
+            self.tick_up()
+        return self.results()
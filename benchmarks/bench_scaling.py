@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scaling benchmarks for ABM of environmental migration. Times model
+ construction, each model_step phase, data_collect and tick_up across
+ population sizes with fixed seeds, records wall time and peak traced
+ memory, and compares against a stored baseline.
+
+Example:
+    python benchmarks/bench_scaling.py --sizes 1000 10000 100000 --out bench.json
+    python benchmarks/bench_scaling.py --baseline bench.json --tolerance 1.25
+
+@author: kelseabest
+"""
+
+#import packages
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import numpy as np
+from ABM_model_steps import ABM_Model
+
+#phases of one tick, in run order, as ABM_Model method names
+PHASES = [('shock', 'step_shock'), ('land_hire', 'step_land'), ('find_work', 'step_work'),
+          ('double_auction', 'double_auction'), ('decide_wealth', 'step_decide'),
+          ('data_collect', 'data_collect'), ('tick_up', 'tick_up')]
+
+#model parameters apart from population size
+PARAMS = {'decision': 'utility', 'mig_util': 30000, 'mig_threshold': 50000,
+          'wealth_factor': 200000, 'ag_factor': 300, 'comm_scale': 0.5,
+          'shock_method': 'shock', 'jobs_avail': 50}
+
+def make_model(n_ind, engine, auction, ticks, seed):
+    p = PARAMS
+    return ABM_Model(ticks, max(n_ind // 5, 1), n_ind, p['decision'], p['mig_util'],
+                     p['mig_threshold'], p['wealth_factor'], p['ag_factor'], p['comm_scale'],
+                     p['shock_method'], p['jobs_avail'], engine=engine, auction=auction, seed=seed)
+
+def measure(fn, memory):
+    #(seconds, peak traced bytes or None, result)
+    if memory:
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+    t = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - t
+    peak = tracemalloc.get_traced_memory()[1] - start if memory else None
+    return seconds, peak, result
+
+def bench_config(n_ind, engine, auction, ticks, seed, memory):
+    #rows of {phase, seconds, peak_bytes} for one population size and engine
+    totals = {}
+    def add(phase, seconds, peak):
+        s, p = totals.get(phase, (0.0, 0))
+        totals[phase] = (s + seconds, max(p, peak or 0))
+
+    seconds, peak, model = measure(lambda: make_model(n_ind, engine, auction, ticks, seed), memory)
+    add('init', seconds, peak)
+    for t in range(ticks):
+        for phase, method in PHASES:
+            seconds, peak, _ = measure(getattr(model, method), memory)
+            add(phase, seconds, peak)
+    return [{'phase': phase, 'seconds': s, 'per_tick': s if phase == 'init' else s / ticks,
+             'peak_bytes': p if memory else None} for phase, (s, p) in totals.items()]
+
+def run(sizes, configs, ticks, seed, memory, max_agent_size):
+    results = []
+    if memory:
+        tracemalloc.start()
+    for n_ind in sizes:
+        for config in configs:
+            engine, auction = config.split(':')
+            if engine == 'agent' and n_ind > max_agent_size:
+                continue
+            for row in bench_config(n_ind, engine, auction, ticks, seed, memory):
+                row.update({'config': config, 'n_ind': n_ind, 'n_hh': max(n_ind // 5, 1)})
+                results.append(row)
+                print("%-14s n_ind=%-8d %-15s %10.4fs/tick  peak %s" % (
+                    config, n_ind, row['phase'], row['per_tick'],
+                    '-' if row['peak_bytes'] is None else '%.1f MB' % (row['peak_bytes'] / 1e6)))
+    if memory:
+        tracemalloc.stop()
+    return results
+
+def metadata(args):
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'ticks': args.ticks, 'seed': args.seed}
+
+def compare(results, baseline, tolerance):
+    #print time ratios against baseline, returns keys slower than tolerance
+    base = {(r['config'], r['n_ind'], r['phase']): r for r in baseline['results']}
+    slower = []
+    print("\n%-14s %-8s %-15s %10s %10s %7s" % ('config', 'n_ind', 'phase', 'base s', 'now s', 'ratio'))
+    for r in results:
+        key = (r['config'], r['n_ind'], r['phase'])
+        if key not in base:
+            continue
+        b = base[key]['per_tick']
+        ratio = r['per_tick'] / b if b > 0 else float('inf')
+        flag = ' SLOWER' if ratio > tolerance else ''
+        print("%-14s %-8d %-15s %10.4f %10.4f %7.2f%s" % (key + (b, r['per_tick'], ratio, flag)))
+        if flag:
+            slower.append(key)
+    return slower
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scaling benchmarks for the migration ABM")
+    parser.add_argument('--sizes', nargs='*', type=int, default=[1000, 10000, 100000],
+                        help="numbers of individuals (households are a fifth)")
+    parser.add_argument('--configs', nargs='*', default=['agent:random', 'vector:sorted'],
+                        help="engine:auction pairs")
+    parser.add_argument('--ticks', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=12345)
+    parser.add_argument('--max-agent-size', type=int, default=10000,
+                        help="skip the agent engine above this many individuals")
+    parser.add_argument('--no-memory', action='store_true', help="skip tracemalloc (faster)")
+    parser.add_argument('--out', default=None, help="write results JSON here")
+    parser.add_argument('--baseline', default=None, help="compare with this results JSON")
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help="flag phases slower than baseline by this ratio")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.configs, args.ticks, args.seed, not args.no_memory,
+                  args.max_agent_size)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'meta': metadata(args), 'results': results}, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        if slower:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
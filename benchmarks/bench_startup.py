@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Startup benchmarks for ABM of environmental migration. Measures cold
+ import time and peak RSS of the model modules in fresh interpreters,
+ and the time and RSS for a process pool worker to start and run a
+ tiny model (what every sweep worker pays), and compares against a
+ stored baseline.
+
+Example:
+    python benchmarks/bench_startup.py --out startup.json
+    python benchmarks/bench_startup.py --baseline startup.json --tolerance 1.25
+
+@author: kelseabest
+"""
+
+#import packages
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+#modules timed on their own, in a fresh interpreter each
+MODULES = ['ABM_model_steps', 'sweep', 'region', 'cli']
+
+#child script: import, then report seconds, peak RSS and heavy modules pulled in
+PROBE = """
+import resource, sys, time
+t = time.perf_counter()
+import %s
+seconds = time.perf_counter() - t
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+print(seconds, rss, int('matplotlib' in sys.modules), len(sys.modules))
+"""
+
+def cold_import(module, repeats):
+    #[{seconds, rss_bytes, matplotlib, modules}] from fresh interpreters
+    rows = []
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    for r in range(repeats):
+        t = time.perf_counter()
+        out = subprocess.check_output([sys.executable, '-c', PROBE % module], env=env, text=True)
+        wall = time.perf_counter() - t
+        seconds, rss, mpl, n = out.split()
+        rows.append({'seconds': float(seconds), 'process_seconds': wall, 'rss_bytes': int(rss),
+                     'matplotlib': bool(int(mpl)), 'modules': int(n)})
+    return rows
+
+def worker_task(): #what a sweep worker does first: import and run a tiny model
+    import resource
+    t = time.perf_counter()
+    from sweep import run_model
+    run_model({'ticks': 1, 'N_hh': 10, 'N_ind': 50}, 0)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return time.perf_counter() - t, rss
+
+def worker_startup(method, repeats):
+    #seconds from pool creation to the first finished task, worker peak RSS
+    rows = []
+    for r in range(repeats):
+        t = time.perf_counter()
+        with ProcessPoolExecutor(1, mp_context=mp.get_context(method)) as pool:
+            task_seconds, rss = pool.submit(worker_task).result()
+        rows.append({'seconds': time.perf_counter() - t, 'task_seconds': task_seconds,
+                     'rss_bytes': rss})
+    return rows
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def run(modules, methods, repeats):
+    results = []
+    for module in modules:
+        rows = cold_import(module, repeats)
+        result = {'case': 'import ' + module, 'seconds': median([r['seconds'] for r in rows]),
+                  'process_seconds': median([r['process_seconds'] for r in rows]),
+                  'rss_bytes': median([r['rss_bytes'] for r in rows]),
+                  'matplotlib': rows[0]['matplotlib'], 'modules': rows[0]['modules']}
+        results.append(result)
+        print("%-28s %8.3fs import %8.3fs process %8.1f MB  modules %d%s" % (
+            result['case'], result['seconds'], result['process_seconds'],
+            result['rss_bytes'] / 1e6, result['modules'],
+            '  (matplotlib loaded)' if result['matplotlib'] else ''))
+    for method in methods:
+        rows = worker_startup(method, repeats)
+        result = {'case': 'worker ' + method, 'seconds': median([r['seconds'] for r in rows]),
+                  'task_seconds': median([r['task_seconds'] for r in rows]),
+                  'rss_bytes': median([r['rss_bytes'] for r in rows])}
+        results.append(result)
+        print("%-28s %8.3fs first task %8.3fs in task %8.1f MB" % (
+            result['case'], result['seconds'], result['task_seconds'], result['rss_bytes'] / 1e6))
+    return results
+
+def metadata(args):
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                         stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'python': platform.python_version(),
+            'machine': platform.machine(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeats': args.repeats}
+
+def compare(results, baseline, tolerance):
+    #print time and RSS ratios against baseline, returns cases worse than tolerance
+    base = {r['case']: r for r in baseline['results']}
+    worse = []
+    print("\n%-28s %10s %10s %7s %8s" % ('case', 'base s', 'now s', 'ratio', 'rss'))
+    for r in results:
+        if r['case'] not in base:
+            continue
+        b = base[r['case']]
+        ratio = r['seconds'] / b['seconds'] if b['seconds'] > 0 else float('inf')
+        rss_ratio = r['rss_bytes'] / b['rss_bytes'] if b['rss_bytes'] > 0 else float('inf')
+        flag = ' WORSE' if ratio > tolerance or rss_ratio > tolerance else ''
+        print("%-28s %10.3f %10.3f %7.2f %8.2f%s" % (r['case'], b['seconds'], r['seconds'],
+                                                    ratio, rss_ratio, flag))
+        if flag:
+            worse.append(r['case'])
+    return worse
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Startup benchmarks for the migration ABM")
+    parser.add_argument('--modules', nargs='*', default=MODULES)
+    parser.add_argument('--methods', nargs='*', default=['spawn', 'fork'],
+                        help="process pool start methods")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--out', default=None, help="write results JSON here")
+    parser.add_argument('--baseline', default=None, help="compare with this results JSON")
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help="flag cases slower or larger than baseline by this ratio")
+    args = parser.parse_args(argv)
+
+    results = run(args.modules, args.methods, args.repeats)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'meta': metadata(args), 'results': results}, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            worse = compare(results, json.load(f), args.tolerance)
+        if worse:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
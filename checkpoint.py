@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Checkpoint, restore and fork a (warmed up) ABM of environmental
+ migration. A checkpoint is a directory with one .npy file per agent
+ column, which can be memory mapped copy-on-write, plus a pickle of
+ everything else (community, random streams, tick, recorded data).
+
+@author: kelseabest
+"""
+
+#import packages
+import os
+import pickle
+import shutil
+import tempfile
+import numpy as np
+
+STORES = ['individual_set', 'hh_set']
+#store attributes that are rebuilt on load rather than saved
+REBUILT = ['data', 'row_of', 'objects', '_members', '_members_version']
+
+def save_checkpoint(model, path):
+    #write model state to directory path (replaced atomically if it exists)
+    path = os.path.abspath(path)
+    tmp = tempfile.mkdtemp(prefix='.ckpt-', dir=os.path.dirname(path))
+    state = dict(model.__dict__)
+    for name in STORES:
+        store = state[name]
+        for col, arr in store.data.items():
+            np.save(os.path.join(tmp, '%s.%s.npy' % (name, col)), arr[:store.size])
+        np.save(os.path.join(tmp, '%s.row_of.npy' % name), store.row_of)
+        meta = {k: v for k, v in store.__dict__.items() if k not in REBUILT}
+        state[name] = (type(store), meta, list(store.data))
+    recorder = state.get('recorder')
+    if recorder is not None: #open file writers can not be saved, keep what is in memory
+        recorder.flush()
+        writer, recorder.writer = recorder.writer, None
+    try:
+        with open(os.path.join(tmp, 'state.pkl'), 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        if recorder is not None:
+            recorder.writer = writer
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+    return path
+
+def _load_array(path, mmap):
+    try:
+        return np.load(path, mmap_mode='c' if mmap else None)
+    except ValueError: #empty arrays can not be mapped
+        return np.load(path)
+
+def load_checkpoint(path, mmap=True):
+    #rebuild a model from a checkpoint, with mmap the agent columns are
+    #copy-on-write maps of the files so unchanged pages stay shared
+    from ABM_model_steps import ABM_Model
+    with open(os.path.join(path, 'state.pkl'), 'rb') as f:
+        state = pickle.load(f)
+    for name in STORES:
+        cls, meta, cols = state[name]
+        store = cls.__new__(cls)
+        store.__dict__.update(meta)
+        store.data = {col: _load_array(os.path.join(path, '%s.%s.npy' % (name, col)), mmap)
+                      for col in cols}
+        store.row_of = np.load(os.path.join(path, '%s.row_of.npy' % name))
+        store.capacity = store.size
+        store.free = meta.get('free', []) #older checkpoints have no freed rows
+        store.objects = [None] * store.size
+        store.version += 1 #membership index is rebuilt on first use
+        state[name] = store
+    model = ABM_Model.__new__(ABM_Model)
+    model.__dict__.update(state)
+    if model.recorder is not None and model.recorder.path is not None:
+        model.recorder.path = None #restored copies do not append to the original file
+        model.recorder.keep = True
+    return model
+
+def set_params(model, **params):
+    #change scenario parameters of a (forked) model
+    for name, value in params.items():
+        if not hasattr(model, name):
+            raise AttributeError("ABM_Model has no parameter %r" % name)
+        setattr(model, name, value)
+        if name == 'comm_scale':
+            model.origin_comm.comm_impact = value
+    model.individual_set.mark_recheck() #e.g. migrants' salary follows mig_util
+
+def fork(model, n, reseed=False, scenarios=None):
+    #n copies of model sharing its agent columns copy-on-write
+    #reseed gives each copy its own child random streams (replicates),
+    #otherwise copies share random numbers (paired scenario comparison)
+    #scenarios is an optional list of n parameter dicts for set_params
+    tmp = tempfile.mkdtemp(prefix='abm-fork-')
+    try:
+        path = save_checkpoint(model, os.path.join(tmp, 'ckpt'))
+        copies = [load_checkpoint(path) for i in range(n)]
+    finally:
+        shutil.rmtree(tmp) #mapped pages stay valid after unlink
+    children = model.seed_seq.spawn(n) if reseed else [None] * n
+    for i, copy in enumerate(copies):
+        if reseed:
+            copy.set_seed(children[i])
+        if scenarios is not None:
+            set_params(copy, **scenarios[i])
+    return copies
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Command line entry point for ABM of environmental migration. Runs
+ one model or a parameter sweep from a TOML or JSON config file.
+
+Example:
+    python cli.py run config.toml
+    python cli.py sweep config.toml
+
+Config (TOML; JSON uses the same keys):
+    [model]              # ABM_Model arguments, sweep.DEFAULTS fill the rest
+    N_hh = 100
+    N_ind = 500
+    seed = 1             # run seed (sweeps use [sweep] seed)
+
+    [converge]           # optional, convergence_monitor arguments
+    window = 3
+    measures = ["total_mig"]
+
+    [output]             # for run
+    data_set = "data_set.csv"
+    migrations = "migrations.csv"
+    plot = "migrations.png"
+
+    [sweep]              # for sweep, [model] values are fixed for every set
+    grid = {mig_threshold = [30000, 50000], comm_scale = [0.2, 0.5]}
+    # or lhs = {mig_util = [10000, 50000]}, samples = 20 and
+    # optionally categories = {shock_method = ["shock", "slow_onset"]}
+    replicates = 10
+    processes = 4
+    seed = 0
+    cache = ".abm_cache"
+    out = "sweep.csv"
+
+@author: kelseabest
+"""
+
+#import packages
+import argparse
+import json
+
+def load_config(path): #dict from a .toml or .json file
+    if path.endswith('.json'):
+        with open(path) as f:
+            return json.load(f)
+    try:
+        import tomllib
+    except ImportError: #python < 3.11
+        try:
+            import tomli as tomllib
+        except ImportError:
+            raise ImportError("TOML configs need python 3.11+ or tomli (pip install tomli)")
+    with open(path, 'rb') as f:
+        return tomllib.load(f)
+
+def run_model_config(config):
+    from sweep import run_outputs
+    params = dict(config.get('model', {}))
+    seed = params.pop('seed', None)
+    data_set, migrations, stop = run_outputs(params, seed, config.get('converge'))
+    output = config.get('output', {})
+    if 'data_set' in output:
+        data_set.to_csv(output['data_set'], index=False)
+    if 'migrations' in output:
+        migrations.to_csv(output['migrations'], index=False)
+    if 'plot' in output:
+        from plotting import plot_migrations, save
+        save(plot_migrations(migrations), output['plot'])
+    print("ran %d ticks, %d households sent a migrant" % (
+        len(migrations), migrations['total_mig'].iloc[-1] if len(migrations) else 0))
+    if stop is not None:
+        print("stopped: %(stop_reason)s at tick %(stop_tick)s" % stop)
+    return data_set, migrations
+
+def run_sweep_config(config):
+    from sweep import run_sweep, param_grid, latin_hypercube
+    fixed = dict(config.get('model', {}))
+    fixed.pop('seed', None)
+    spec = config.get('sweep', {})
+    if 'lhs' in spec:
+        ranges = {k: tuple(v) for k, v in spec['lhs'].items()} #[low, high]
+        ranges.update(spec.get('categories', {})) #lists of values
+        design = latin_hypercube(ranges, spec.get('samples', 10), spec.get('seed', 0))
+    else:
+        design = param_grid(**spec.get('grid', {}))
+    design = [dict(fixed, **d) for d in design]
+    cache = None
+    if 'cache' in spec:
+        from result_cache import result_cache
+        cache = result_cache(spec['cache'], spec.get('cache_max_bytes'), spec.get('cache_max_age'))
+    table = run_sweep(design, spec.get('replicates', 1), spec.get('processes'),
+                      spec.get('chunksize', 4), spec.get('seed', 0),
+                      converge=config.get('converge'), cache=cache)
+    out = spec.get('out', 'sweep.csv')
+    table.to_csv(out, index=False)
+    print("wrote %d rows for %d parameter sets to %s" % (len(table), len(design), out))
+    return table
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the migration ABM from a config file")
+    parser.add_argument('command', choices=['run', 'sweep'])
+    parser.add_argument('config', help="TOML or JSON config file")
+    args = parser.parse_args(argv)
+    config = load_config(args.config)
+    if args.command == 'run':
+        run_model_config(config)
+    else:
+        run_sweep_config(config)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Steady-state detection for runs of ABM of environmental migration.
+A convergence_monitor is checked by ABM_Model.run after each tick.
+It stops the run once every watched measure has stayed within a
+ tolerance over a window of ticks, and records why and when the run
+ stopped ("converged", or "horizon" when it ran all ticks).
+
+Any object with update(model) -> bool and finish() can be
+ passed to ABM_Model.run instead.
+
+@author: kelseabest
+"""
+
+#import packages
+from collections import deque
+from agent_store import EMPLOYMENT_CODES
+import numpy as np
+
+def total_mig(model): #households that have sent a migrant
+    hh = model.hh_set
+    return float(hh.someone_migrated[hh.live_rows()].sum())
+
+def wealth_stats(model): #mean, standard deviation and quartiles of household wealth
+    w = model.hh_set.wealth[model.hh_set.live_rows()]
+    if len(w) == 0:
+        return np.zeros(5)
+    return np.concatenate(([w.mean(), w.std()], np.percentile(w, [25, 50, 75])))
+
+def employment_shares(model): #share of individuals in each employment category
+    ind = model.individual_set
+    counts = np.bincount(ind.employment[ind.live_rows()], minlength=len(EMPLOYMENT_CODES))
+    return counts / max(counts.sum(), 1)
+
+#measure name -> function of the model returning a number or an array
+MEASURES = {'total_mig': total_mig, 'wealth': wealth_stats, 'employment': employment_shares}
+
+class convergence_monitor :
+    def __init__(self, window=3, rtol=0.01, atol=0.0, min_ticks=0, measures=None):
+        #window: ticks every measure must stay within atol + rtol * |value|
+        #min_ticks: never stop before this many ticks have run
+        #measures: names from MEASURES or a {name: function} dict, default all
+        self.window = window
+        self.rtol = rtol
+        self.atol = atol
+        self.min_ticks = min_ticks
+        if measures is None:
+            measures = list(MEASURES)
+        if not isinstance(measures, dict):
+            unknown = [m for m in measures if m not in MEASURES]
+            if unknown:
+                raise ValueError("unknown convergence measures %s" % unknown)
+            measures = {m: MEASURES[m] for m in measures}
+        self.measures = measures
+        self.history = {name: deque(maxlen=window + 1) for name in measures}
+        self.stop_reason = None
+        self.stop_tick = None
+        self.last_tick = None
+        self.unsettled = [] #measures still moving at the last check
+
+    def update(self, model): #record this tick's measures, True once converged
+        self.last_tick = model.tick
+        for name, fn in self.measures.items():
+            self.history[name].append(np.atleast_1d(np.asarray(fn(model), dtype=float)))
+        if model.tick + 1 < self.min_ticks:
+            return False
+        self.unsettled = [name for name, h in self.history.items()
+                          if len(h) <= self.window or not self._settled(np.array(h))]
+        if self.unsettled:
+            return False
+        self.stop_reason = 'converged'
+        self.stop_tick = model.tick
+        return True
+
+    def _settled(self, values): #values is (window + 1) x measure width
+        spread = values.max(axis=0) - values.min(axis=0)
+        return bool(np.all(spread <= self.atol + self.rtol * np.abs(values).max(axis=0)))
+
+    def finish(self): #called when the run ends without converging
+        if self.stop_reason is None:
+            self.stop_reason = 'horizon'
+            self.stop_tick = self.last_tick
+
+    def summary(self): #{stop_reason, stop_tick, unsettled measures}
+        return {'stop_reason': self.stop_reason, 'stop_tick': self.stop_tick,
+                'unsettled': ','.join(self.unsettled)}
@@ -8,22 +8,48 @@ Working definition of decision class for ABM
 """
 
 #import packages
-import random
-import math
 import numpy as np
-import matplotlib.pyplot as plt
 
 class decision :
     #method decide returns True or False
-    #subclass of decisions
+    #subclass of decisions, subclasses implement decide_batch: a boolean
+    #mask over household store rows (total_util_w_migrant is already set)
     def __init__(self): #initialize outcome
         self.outcome = False
-    def decide(self):
-        pass
+    def decide_batch(self, hh, rows):
+        return np.zeros(len(rows), dtype=bool)
+    def decide(self, household): #one household, via decide_batch
+        self.outcome = bool(self.decide_batch(household._store, np.array([household._row]))[0])
+        return self.outcome
 
 class utility_max(decision):
     def __init__(self): #initialize utilities
         super().__init__()
-    def decide(self, household):
-        if household.total_utility < household.total_util_w_migrant:
-            self.outcome = True
+    def decide_batch(self, hh, rows):
+        return hh.total_utility[rows] < hh.total_util_w_migrant[rows]
+
+class push_threshold(utility_max):
+    #utility maximization, plus households that are not secure send a
+    #migrant as a last resort
+    def decide_batch(self, hh, rows):
+        return super().decide_batch(hh, rows) | ~hh.secure[rows]
+
+#decision method name (ABM_Model decision argument) -> strategy
+DECISIONS = {}
+
+def register_decision(name, strategy): #add a decision method, e.g. for a new behavioral rule
+    if not isinstance(strategy, decision):
+        raise TypeError("decision methods must be decision instances, got %r" % (strategy,))
+    DECISIONS[name] = strategy
+    return strategy
+
+def get_decision(method): #strategy for a registered name (or a decision instance)
+    if isinstance(method, decision):
+        return method
+    try:
+        return DECISIONS[method]
+    except KeyError:
+        raise ValueError("unknown decision method %r, registered: %s" % (method, sorted(DECISIONS)))
+
+register_decision('utility', utility_max())
+register_decision('push_threshold', push_threshold())
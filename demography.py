@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Demographic dynamics for ABM of environmental migration: births,
+ deaths and the formation and dissolution of households, once a tick
+ after everyone has aged. Dead individuals and dissolved households
+ free their store rows, which births and new households reuse, so
+ with preallocated stores a multi decade run neither reallocates nor
+ reindexes, and id lookups stay O(1).
+
+Example:
+    m = ABM_Model(..., demography=True) #or a dict overriding DEMOGRAPHY
+    m.run()
+    m.demography.history #births, deaths, ... per tick
+
+@author: kelseabest
+"""
+
+#import packages
+from agent_store import GENDER_CODES, code_of
+from population import assign_heads
+import numpy as np
+
+MALE = code_of(GENDER_CODES, 'M')
+FEMALE = code_of(GENDER_CODES, 'F')
+
+#default annual rates, override any of them through ABM_Model(demography={...})
+DEMOGRAPHY = {
+    'infant_mortality': 0.03, #death probability in the first year
+    'background_mortality': 0.002, #age independent part of adult mortality
+    'gompertz_a': 5e-5, #mortality a * exp(b * age), about 3% at 70 and 16% at 90
+    'gompertz_b': 0.09,
+    'fertility': 0.08, #birth probability of a woman of fertile age
+    'fertile_ages': (15, 49),
+    'formation_rate': 0.1, #chance a grown son who is not head leaves to found a household
+    'formation_ages': (22, 40),
+    'partner_ages': (18, 35), #women who may leave with him
+    'wealth_share': 0.2, #share of the parents' wealth and land taken along
+    'headroom': 1.5, #stores are preallocated to this multiple of the initial population
+}
+
+class population_dynamics :
+    def __init__(self, rng, **rates):
+        unknown = sorted(set(rates) - set(DEMOGRAPHY))
+        if unknown:
+            raise ValueError("unknown demography rates %s" % unknown)
+        self.rng = rng #the model's 'demography' stream
+        self.rates = dict(DEMOGRAPHY, **rates)
+        self.history = [] #one dict of event counts per tick
+
+    def step(self, model): #one year of deaths, births and household changes
+        ind, hh = model.individual_set, model.hh_set
+        size_change = np.zeros(len(hh), dtype=np.int64) #per household row
+        events = {'tick': model.tick}
+        #births first so newborns face infant mortality in their first year
+        events['births'] = self.births(ind, hh, size_change)
+        events['deaths'] = self.deaths(ind, hh, size_change)
+        events['new_households'] = self.form_households(ind, hh, size_change)
+        events['dissolved'] = self.dissolve(ind, hh)
+        self.resize(hh, size_change)
+        self.replace_heads(ind, hh)
+        events['population'] = ind.n_alive
+        events['households'] = hh.n_alive
+        self.history.append(events)
+        return events
+
+    def deaths(self, ind, hh, size_change):
+        r = self.rates
+        live = np.flatnonzero(ind.alive)
+        age = ind.age[live]
+        risk = np.where(age < 1, r['infant_mortality'],
+                        r['background_mortality'] + r['gompertz_a'] * np.exp(r['gompertz_b'] * age))
+        dead = live[self.rng.random(len(live)) < risk]
+        hh_rows = hh.rows(ind.hh[dead])
+        np.add.at(size_change, hh_rows[hh_rows >= 0], -1) #not those without a household
+        ind.remove(dead)
+        return len(dead)
+
+    def births(self, ind, hh, size_change):
+        lo, hi = self.rates['fertile_ages']
+        women = np.flatnonzero(ind.alive & (ind.gender == FEMALE) & (ind.age >= lo)
+                               & (ind.age <= hi) & (ind.hh != 0) & ~ind.migrated)
+        mothers = women[self.rng.random(len(women)) < self.rates['fertility']]
+        hh_ids = ind.hh[mothers]
+        born = ind.add_many(len(mothers), age=0.0, hh=hh_ids, ag_factor=ind.ag_factor[mothers],
+                            gender=np.where(self.rng.random(len(mothers)) < 0.5, MALE, FEMALE))
+        ind.mark_recheck(born)
+        np.add.at(size_change, hh.rows(hh_ids), 1)
+        return len(mothers)
+
+    def form_households(self, ind, hh, size_change):
+        #grown sons leave, each with a share of his parents' wealth and land
+        #and, while there are any, a partner from another household
+        r = self.rates
+        lo, hi = r['formation_ages']
+        sons = np.flatnonzero(ind.alive & (ind.gender == MALE) & (ind.age >= lo) & (ind.age <= hi)
+                              & ~ind.head & (ind.hh != 0) & ~ind.migrated)
+        leaving = sons[self.rng.random(len(sons)) < r['formation_rate']]
+        if len(leaving) == 0:
+            return 0
+        lo, hi = r['partner_ages']
+        women = np.flatnonzero(ind.alive & (ind.gender == FEMALE) & (ind.age >= lo) & (ind.age <= hi)
+                               & ~ind.head & (ind.hh != 0) & ~ind.migrated)
+        women = self.rng.permutation(women)[:len(leaving)]
+        partners = np.full(len(leaving), -1, dtype=np.int64)
+        partners[:len(women)] = women
+        paired = partners >= 0
+        paired[paired] = ind.hh[partners[paired]] != ind.hh[leaving[paired]] #not a sister
+
+        #the parents' share is split evenly between the sons leaving them
+        parent_ids = ind.hh[leaving]
+        parents = hh.rows(parent_ids)
+        leavers = np.bincount(parents, minlength=len(hh))
+        share = r['wealth_share'] / leavers[parents]
+        wealth = hh.wealth[parents] * share
+        land = hh.land_owned[parents] * share
+        left = np.unique(parents)
+        hh.wealth[left] *= 1 - r['wealth_share']
+        hh.land_owned[left] *= 1 - r['wealth_share']
+        hh.land_prod[left] = hh.ag_factor[left] * hh.land_owned[left]
+        np.add.at(size_change, parents, -1)
+        np.add.at(size_change, hh.rows(ind.hh[partners[paired]]), -1)
+
+        size = 1 + paired
+        new = hh.add_many(len(leaving), wealth=wealth, land_owned=land, hh_size=size,
+                          wellbeing_threshold=size * 20000, expenses=size * 20000,
+                          ag_factor=hh.ag_factor[parents], head=ind.id[leaving],
+                          land_prod=hh.ag_factor[parents] * land)
+        new_ids = hh.id[new]
+        ind.hh[leaving] = new_ids
+        ind.hh[partners[paired]] = new_ids[paired]
+        ind.head[leaving] = True
+        ind.version += 1
+        #new households and parents with less land to work
+        ind.mark_recheck(np.concatenate((leaving, partners[paired])), hh_ids=parent_ids)
+        return len(leaving)
+
+    def dissolve(self, ind, hh): #households without a living member
+        hh_rows = hh.rows(ind.hh[ind.alive])
+        counts = np.bincount(hh_rows[hh_rows >= 0], minlength=len(hh))
+        rows = np.flatnonzero((hh.id != 0) & (counts == 0))
+        hh.remove(rows)
+        return len(rows)
+
+    def resize(self, hh, size_change):
+        #births, deaths and departures change size, poverty threshold and expenses
+        rows = np.flatnonzero(size_change)
+        rows = rows[hh.id[rows] != 0] #dissolved
+        if len(rows) == 0:
+            return
+        size = np.maximum(hh.hh_size[rows] + size_change[rows], 1)
+        hh.hh_size[rows] = size
+        hh.wellbeing_threshold[rows] = size * 20000
+        hh.expenses[rows] = size * 20000
+
+    def replace_heads(self, ind, hh): #households whose head died or left
+        live = hh.live_rows()
+        heads = hh.head[live]
+        lost = hh.id[live][(heads == 0) | (ind.rows(heads) < 0)]
+        if len(lost) == 0:
+            return
+        assign_heads(ind, hh, np.flatnonzero(ind.alive & np.isin(ind.hh, lost)))
@@ -8,140 +8,132 @@ Working definition of agent class (household) for ABM
 """
 
 #import packages
-from decisions import *
-import random
-import math
+from decisions import get_decision
+from agent_store import GENDER_CODES, code_of, column, household_store
 import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
 
 #object class Household
 class Household :
-    next_uid = 1
-    def __init__(self, wealth_factor, ag_factor): #initialize agents
-        self.unique_id = Household.next_uid
-        Household.next_uid += 1
-
+    #state lives in a household_store row, these read/write through it
+    unique_id = column(field='id')
+    wealth = column()
+    hh_size = column()
+    head = column(nullable=True)
+    land_owned = column()
+    secure = column()
+    wellbeing_threshold = column()
+    network_moves = column()
+    someone_migrated = column()
+    land_impacted = column()
+    wta = column()
+    wtp = column()
+    num_employees = column()
+    payments = column() #running total owed to employees
+    expenses = column()
+    total_utility = column()
+    total_util_w_migrant = column()
+    num_shocked = column()
+    ag_factor = column()
+    land_prod = column()
+
+    def __init__(self, wealth_factor, ag_factor, hh_set): #initialize agents
         #radomly initialize wealth
-        self.wealth = random.gauss(wealth_factor, wealth_factor / 5)
-
-        self.hh_size = np.random.poisson(5.13)
-        if self.hh_size < 1:
-            self.hh_size = 1
-        self.individuals = pd.DataFrame() #initialize DF to hold individuals
-        self.head = None
-        self.land_owned = np.random.lognormal(4.2, 1) #
-        self.secure = True 
-        self.wellbeing_threshold = self.hh_size * 20000 #world bank poverty threshold
-
-        #look at these network vars later
-        self.network = []
-        self.network_moves = 0
-
-        self.someone_migrated = 0
+        rng = hh_set.rng
+        wealth = rng.normal(wealth_factor, wealth_factor / 5)
+
+        hh_size = rng.poisson(5.13)
+        if hh_size < 1:
+            hh_size = 1
+        land_owned = rng.lognormal(4.2, 1) #
+        uid, row = hh_set.add(wealth=wealth, hh_size=hh_size, land_owned=land_owned,
+                              wellbeing_threshold=hh_size * 20000, #world bank poverty threshold
+                              expenses=hh_size * 20000, #this represents $$ to sustain HH (same as threshold)
+                              ag_factor=ag_factor,
+                              land_prod=ag_factor * land_owned) #productivity from own land
+        self._store = hh_set
+        self._row = row
+        self._init_extra()
+        hh_set.objects[row] = self
+
+    def _init_extra(self): #per-object state that is not columnar
         self.history = []
         self.success = []
-        self.land_impacted = False
-        self.wta = 0
-        self.wtp = 0
-        self.num_employees = 0 
         self.employees = []
-        self.payments = []
-        self.expenses = self.hh_size *20000 #this represents $$ to sustain HH (same as threshold)
-        self.total_utility = 0
-        self.total_util_w_migrant = 0
-        self.num_shocked = 0
-        self.ag_factor = ag_factor 
-        self.land_prod = self.ag_factor * self.land_owned #productivity from own land 
 
+    @property
+    def network(self): #ids of neighbor households in the social network
+        net = self._store.network
+        if net is None or self._row >= net.n: #founded past the network's rows
+            return []
+        return self._store.id[net.neighbors(self._row)].tolist()
 
 #assign individuals to a household
     def gather_members(self, individual_set):
-        ind_no_hh = individual_set[individual_set['hh'].isnull()]
+        ind_no_hh = np.flatnonzero(individual_set.hh == 0)
         if len(ind_no_hh) > self.hh_size:
-            self.individuals = pd.concat([self.individuals, ind_no_hh.sample(self.hh_size)])
+            chosen = self._store.rng.choice(ind_no_hh, self.hh_size, replace=False)
         else:
-            self.individuals = pd.concat([self.individuals, ind_no_hh.sample(len(ind_no_hh))])
+            chosen = ind_no_hh
         #update information for hh and individual
-        self.individuals['ind'].hh = self.unique_id
-        individual_set.loc[(individual_set.id.isin(self.individuals['id'])), 'hh'] = self.unique_id
-        for i in individual_set.loc[(individual_set.hh == self.unique_id), 'ind']:
-            i.hh = self.unique_id
-        self.individuals['hh'] = self.unique_id
+        individual_set.hh[chosen] = self.unique_id
+        individual_set.version += 1 #membership index is now stale
 
     def assign_head(self, individual_set):
-        my_individuals = individual_set.loc[(individual_set['hh'] == self.unique_id)]
-        males = my_individuals[my_individuals['gender']== 'M']
-        females = my_individuals[my_individuals['gender']== 'F']
+        my_rows = np.flatnonzero(individual_set.hh == self.unique_id)
+        males = my_rows[individual_set.gender[my_rows] == code_of(GENDER_CODES, 'M')]
+        females = my_rows[individual_set.gender[my_rows] == code_of(GENDER_CODES, 'F')]
         if (len(males) == 0 and len(females) == 0):
             head_hh = None
             return 
         elif (len(males) != 0):
-            head_hh = males[males['age'] == max(males['age'])]
-            self.head = head_hh
-            head_hh['ind'].head = True
-            #replace in individual set
-            individual_set.loc[(individual_set.id.isin(head_hh['id'])), 'ind'] = head_hh
+            head_hh = males[np.argmax(individual_set.age[males])]
         else:
-            head_hh = females[females['age'] == max(females['age'])]
-            self.head = head_hh
-            head_hh['ind'].head = True
-            #replace in individual set
-            individual_set.loc[(individual_set.id.isin(head_hh['id'])), 'ind'] = head_hh
+            head_hh = females[np.argmax(individual_set.age[females])]
+        self.head = individual_set.id[head_hh].item()
+        individual_set.head[head_hh] = True
 
 
     def check_land(self, community, comm_scale):
         if community.impacted == True:
-            if random.random() < comm_scale:
+            rng = self._store.rng
+            if rng.random() < comm_scale:
                 self.land_impacted = True
                 self.num_shocked += 1
-                self.wealth = self.wealth * random.random()
+                self._store.shocks += 1
+                self.wealth = self.wealth * rng.random()
                 self.land_prod = 0
 
-    def migrate(self, method, individual_set, mig_util, mig_threshold):
+    def migrate(self, method, individual_set, mig_util, mig_threshold, network_effect=0,
+                candidate=None):
         util_migrate = mig_util #how do I define these?
 
-        my_individuals = individual_set.loc[(individual_set['hh'] == self.unique_id, 'ind')]
-        can_migrate = []
-        for i in my_individuals:
-            if i.can_migrate == True and i.migrated == False:
-                can_migrate.append(i)
-        if len(can_migrate) != 0:
-            migrant = np.random.choice(can_migrate, 1)
-        else:
+        #candidate: this household's pre-drawn migrant row (-1 for none), see pick_migrants
+        members = individual_set.members()
+        if candidate is None:
+            can_migrate = members.eligible_of(self.unique_id)
+            can_migrate = can_migrate[~individual_set.migrated[can_migrate]]
+            candidate = self._store.rng.choice(can_migrate) if len(can_migrate) != 0 else -1
+        if candidate < 0:
             return
+        migrant = [individual_set.get(individual_set.id[candidate].item())]
 
-        if method == 'utility' and self.wealth > mig_threshold:
-            self.total_util_w_migrant = self.total_utility - migrant[0].salary + util_migrate 
-            decision = utility_max()
-            decision.decide(self)
-            if decision.outcome == True:
+        decision = get_decision(method) #shared strategy from the registry
+        if self.wealth > mig_threshold:
+            self.total_util_w_migrant = (self.total_utility - migrant[0].salary + util_migrate
+                                         + network_effect * self.network_moves) #migrant neighbors
+            if decision.decide(self) == True:
                 self.wealth = self.wealth - mig_threshold #subtract out mig_threshold cost
                 self.someone_migrated += 1
+                self._store.new_migrants += 1
+                old_salary = migrant[0].salary
                 migrant[0].migrated = True
                 migrant[0].salary = util_migrate
-                individual_set.loc[(individual_set.id == migrant[0].unique_id), 'ind'] = migrant[0]
-
-        if method == 'push_threshold' and self.wealth > mig_threshold:
-            self.total_util_w_migrant = self.total_utility - migrant[0].salary + util_migrate 
-            decision = push_threshold()
-            decision.decide(self)
-            if decision.outcome == True:
-                self.wealth = self.wealth - mig_threshold #subtract out mig_threshold cost
-                self.someone_migrated += 1
-                migrant[0].migrated = True
-                migrant[0].salary = util_migrate
-                individual_set.loc[(individual_set.id == migrant[0].unique_id), 'ind'] = migrant[0]
-
-        else:
-            pass
+                members.moved(migrant[0]._row, self.unique_id, old_salary)
 
     
     def sum_utility(self, individual_set):
-        my_individuals = individual_set.loc[(individual_set['hh'] == self.unique_id, 'ind')]
-        sum_util = 0
-        for i in my_individuals:
-            sum_util = sum_util + i.salary
+        #per household salary sums come from the membership index
+        sum_util = individual_set.members().salary_of(self.unique_id)
         self.total_utility = sum_util
 
         if self.total_utility < self.wellbeing_threshold:
@@ -157,19 +149,16 @@ class Household :
 
         if self.num_employees > 0: 
             self.wtp = ((self.ag_factor * self.land_owned) / (self.num_employees + 1))
-            self.wta = (self.wellbeing_threshold / self.hh_size) * random.random() 
+            self.wta = (self.wellbeing_threshold / self.hh_size) * self._store.rng.random() 
         else:
             self.wtp = 0
-            self.wta = (self.wellbeing_threshold / self.hh_size) * random.random()
+            self.wta = (self.wellbeing_threshold / self.hh_size) * self._store.rng.random()
 
 
     def update_wealth(self, individual_set):
         #update wealth here
-        my_individuals = individual_set.loc[(individual_set['hh'] == self.unique_id, 'ind')]
-        sum_salaries = 0  
         #sum across all salaries 
-        for i in my_individuals:
-            sum_salaries = sum_salaries + i.salary
+        sum_salaries = individual_set.members().salary_of(self.unique_id)
         
         self.wealth = self.wealth + sum_salaries - self.expenses - np.sum(self.payments) + self.land_prod
         
@@ -182,3 +171,5 @@ class Household :
         self.land_prod = self.ag_factor * self.land_owned
         self.employees = []
 
+
+household_store.agent_class = Household
@@ -8,32 +8,38 @@ Working definition of individual class for ABM
 """
 
 #import packages
-from decisions import *
-import random
-import math
-import numpy as np
-import matplotlib.pyplot as plt
+from agent_store import EMPLOYMENT_CODES, GENDER_CODES, code_of, column, individual_store
 
 class Individual :
-    next_uid = 1
+    #state lives in an individual_store row, these read/write through it
+    unique_id = column(field='id')
+    age = column()
+    gender = column(codes=GENDER_CODES)
+    hh = column(nullable=True)
+    employment = column(codes=EMPLOYMENT_CODES)
+    salary = column()
+    employer = column(nullable=True)
+    can_migrate = column()
+    head = column()
+    migrated = column()
+    ag_factor = column()
+    alive = column()
+    wta = column()
 
-    def __init__(self, ag_factor): #initialize
-        self.unique_id = Individual.next_uid
-        Individual.next_uid += 1
-        self.age = np.random.weibull(1.68) * 33.6
+    def __init__(self, ag_factor, individual_set): #initialize
+        rng = individual_set.rng
+        age = rng.weibull(1.68) * 33.6
         gend_arr = ['M', 'F']
-        self.gender = np.random.choice(gend_arr, 1)
-        self.hh = None
-        self.employment = None
-        self.salary = 0
-        self.employer = None
-        self.can_migrate  = False
-        self.head = False
-        self.migrated = False
-        self.ag_factor = ag_factor
-        self.alive = True 
-        self.wta = 0 
+        gender = rng.choice(gend_arr)
+        uid, row = individual_set.add(age=age, gender=code_of(GENDER_CODES, gender),
+                                      ag_factor=ag_factor)
+        self._store = individual_set
+        self._row = row
+        self._init_extra()
+        individual_set.objects[row] = self
 
+    def _init_extra(self): #no per-object state beyond the store row
+        pass
 
     def age_up(self):
         self.age = self.age + 1
@@ -48,12 +54,11 @@ class Individual :
     def find_work(self, hh_set, mig_util): 
         #look for ag in own land first
         util_migrate = mig_util #global var
-        my_hh = hh_set[hh_set['hh_id'] == self.hh]
         
         if self.hh == None:
             return
         else:
-            my_house = my_hh.loc[0,'household']
+            my_house = hh_set.get(self.hh)
 
         if self.migrated == True:
             self.salary = util_migrate
@@ -73,3 +78,5 @@ class Individual :
             self.employment = "Looking" 
             self.wta = my_house.wta
             self.salary = 0  
+
+individual_store.agent_class = Individual
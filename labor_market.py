@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sorted-book clearing of the agricultural labor market for ABM
+ of environmental migration. Alternative to ABM_Model.double_auction
+ with the same rules (wtp >= wta, midpoint salary, per employer
+ num_employees capacity) in near linear time.
+
+@author: kelseabest
+"""
+
+#import packages
+from agent_store import EMPLOYMENT_CODES, code_of
+import numpy as np
+
+LOOKING = code_of(EMPLOYMENT_CODES, 'Looking')
+OTHER_AG = code_of(EMPLOYMENT_CODES, 'OtherAg')
+UNSKILLED = code_of(EMPLOYMENT_CODES, 'OtherNonAg_Unskilled')
+SKILLED = code_of(EMPLOYMENT_CODES, 'OtherNonAg_Skilled')
+
+def clear_sorted_book(wta, wtp, capacity, rng, worker_group=None, employer_group=None):
+    #match workers (wta) to employers (wtp, capacity) with wtp >= wta
+    #each round every unmatched worker proposes to a uniformly random employer
+    #that still has capacity and would pay enough (a suffix of the wtp sorted
+    #book), employers accept proposals in random order up to capacity
+    #optional integer groups (e.g. replicates) only trade within themselves
+    #returns (worker index, employer index, rounds)
+    capacity = np.array(capacity, dtype=np.int64)
+    if worker_group is None:
+        w_key, e_key, w_end = wta, wtp, None
+    else: #exact integer price ranks, shifted so groups occupy disjoint key ranges
+        values, codes = np.unique(np.concatenate([wtp, wta]), return_inverse=True)
+        span = len(values) + 1
+        e_key = np.asarray(employer_group, dtype=np.int64) * span + codes[:len(wtp)]
+        w_key = np.asarray(worker_group, dtype=np.int64) * span + codes[len(wtp):]
+        w_end = (np.asarray(worker_group, dtype=np.int64) + 1) * span
+    workers = np.arange(len(wta))
+    matched_w = []
+    matched_e = []
+    rounds = 0
+    while len(workers) > 0:
+        open_emp = np.flatnonzero(capacity > 0)
+        if len(open_emp) == 0:
+            break
+        book = open_emp[np.argsort(e_key[open_emp], kind='stable')]
+        lo = np.searchsorted(e_key[book], w_key[workers], side='left')
+        hi = len(book) if w_end is None else np.searchsorted(e_key[book], w_end[workers], side='left')
+        keep = lo < hi #nobody will ever pay enough
+        workers, lo = workers[keep], lo[keep]
+        if w_end is not None:
+            hi = hi[keep]
+        if len(workers) == 0:
+            break
+        rounds += 1
+        emp = book[lo + (rng.random(len(workers)) * (hi - lo)).astype(np.int64)]
+
+        #accept in random order up to remaining capacity
+        order = rng.permutation(len(workers))
+        order = order[np.argsort(emp[order], kind='stable')]
+        w_sorted, e_sorted = workers[order], emp[order]
+        start = np.ones(len(e_sorted), dtype=bool)
+        start[1:] = e_sorted[1:] != e_sorted[:-1]
+        group_start = np.maximum.accumulate(np.where(start, np.arange(len(e_sorted)), 0))
+        accept = (np.arange(len(e_sorted)) - group_start) < capacity[e_sorted]
+
+        matched_w.append(w_sorted[accept])
+        matched_e.append(e_sorted[accept])
+        capacity -= np.bincount(e_sorted[accept], minlength=len(capacity))
+        workers = np.sort(w_sorted[~accept])
+    if matched_w:
+        return np.concatenate(matched_w), np.concatenate(matched_e), rounds
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), rounds
+
+def fill_non_ag_jobs(model, looking):
+    #workers left over may take an unskilled or a skilled job in the community
+    ind, hh = model.individual_set, model.hh_set
+    rng = model.streams['auction']
+    skilled = hh.wealth[hh.rows(ind.hh[looking])] > model.wealth_factor
+    placed = {}
+    for group, code, pay in [(looking[~skilled], UNSKILLED, 24000), #some small number
+                             (looking[skilled], SKILLED, 50000)]: #some greater number
+        if len(group) > model.origin_comm.avail_jobs / 2:
+            group = rng.choice(group, round(model.origin_comm.avail_jobs / 2), replace=False)
+        ind.employment[group] = code
+        ind.salary[group] = pay * rng.random(len(group))
+        ind.touch(group)
+        placed[code] = len(group)
+    return placed[UNSKILLED], placed[SKILLED]
+
+def sorted_double_auction(model):
+    ind, hh = model.individual_set, model.hh_set
+    looking = np.flatnonzero(ind.employment == LOOKING)
+    employers = np.flatnonzero(hh.num_employees > 0)
+
+    w, e, rounds = clear_sorted_book(ind.wta[looking], hh.wtp[employers],
+                                     hh.num_employees[employers], model.streams['auction'])
+    workers, emp_rows = looking[w], employers[e]
+    salary = (ind.wta[workers] + hh.wtp[emp_rows]) / 2
+    ind.salary[workers] = salary
+    ind.touch(workers)
+    ind.employment[workers] = OTHER_AG
+    ind.employer[workers] = hh.id[emp_rows]
+    np.subtract.at(hh.num_employees, emp_rows, 1)
+    np.add.at(hh.payments, emp_rows, salary)
+    model.got_job += len(workers)
+
+    unskilled, skilled = fill_non_ag_jobs(model, np.flatnonzero(ind.employment == LOOKING))
+    return {'auction': 'sorted', 'looking': len(looking), 'employers': len(employers),
+            'matches': len(workers), 'rounds': rounds,
+            'unskilled': unskilled, 'skilled': skilled}
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Household social network for ABM of environmental migration, stored
+ as an undirected CSR adjacency over household rows. Neighbor counts
+ (e.g. neighbors that sent a migrant) are sparse matrix-vector
+ products, computed for all households at once each tick.
+
+@author: kelseabest
+"""
+
+#import packages
+from agent_store import segment_sum
+import numpy as np
+
+class hh_network :
+    def __init__(self, n, indptr, indices):
+        self.n = n #number of households (rows)
+        self.indptr = indptr #row k's neighbors are indices[indptr[k]:indptr[k + 1]]
+        self.indices = indices
+
+    @classmethod
+    def from_edges(cls, n, src, dst):
+        #undirected graph from edge lists, drops self loops and duplicates
+        src, dst = np.asarray(src, dtype=np.int64), np.asarray(dst, dtype=np.int64)
+        keep = src != dst
+        src, dst = src[keep], dst[keep]
+        keys = np.sort(np.concatenate([src * n + dst, dst * n + src]))
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        keys = keys[first]
+        rows, cols = keys // n, keys % n
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=n)))).astype(np.int64)
+        return cls(n, indptr, cols)
+
+    def degree(self):
+        return np.diff(self.indptr)
+
+    def neighbors(self, row):
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def drop(self, rows): #remove every tie of rows (e.g. freed household rows)
+        gone = np.zeros(self.n, dtype=bool)
+        gone[rows[rows < self.n]] = True
+        src = np.repeat(np.arange(self.n), self.degree())
+        keep = ~(gone[src] | gone[self.indices])
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(src[keep], minlength=self.n)))).astype(np.int64)
+        self.indices = self.indices[keep]
+
+    def neighbor_sum(self, x):
+        #A @ x for the adjacency matrix A, one value per household row
+        return segment_sum(np.asarray(x)[self.indices], self.indptr)
+
+def random_network(n, mean_degree, rng):
+    #Erdos-Renyi style graph with about n * mean_degree / 2 edges
+    m = int(round(n * mean_degree / 2))
+    return hh_network.from_edges(n, rng.integers(0, n, m), rng.integers(0, n, m))
+
+def small_world_network(n, mean_degree, rewire, rng):
+    #Watts-Strogatz: ring lattice with mean_degree / 2 neighbors per side,
+    #each edge's far end rewired to a random household with probability rewire
+    half = max(int(mean_degree) // 2, 1)
+    src = np.repeat(np.arange(n), half)
+    dst = (src + np.tile(np.arange(1, half + 1), n)) % n
+    moved = rng.random(len(dst)) < rewire
+    dst[moved] = rng.integers(0, n, moved.sum())
+    return hh_network.from_edges(n, src, dst)
+
+def community_network(n, mean_degree, n_groups, within, rng):
+    #stochastic block model: households in n_groups groups, a share within
+    #of the edges join two households of the same group, the rest are random
+    groups = rng.integers(0, n_groups, n)
+    m = int(round(n * mean_degree / 2))
+    m_in = int(round(m * within))
+    members = np.argsort(groups, kind='stable')
+    sizes = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(sizes)))
+    src_in = rng.integers(0, n, m_in)
+    g = groups[src_in]
+    dst_in = members[starts[g] + (rng.random(m_in) * sizes[g]).astype(np.int64)]
+    src_out = rng.integers(0, n, m - m_in)
+    dst_out = rng.integers(0, n, m - m_in)
+    net = hh_network.from_edges(n, np.concatenate([src_in, src_out]),
+                                np.concatenate([dst_in, dst_out]))
+    net.groups = groups
+    return net
+
+def make_network(kind, n, mean_degree, rng, rewire=0.1, n_groups=10, within=0.8):
+    #network by name: "random", "small_world" or "community"
+    if kind == 'random':
+        return random_network(n, mean_degree, rng)
+    if kind == 'small_world':
+        return small_world_network(n, mean_degree, rewire, rng)
+    if kind == 'community':
+        return community_network(n, mean_degree, n_groups, within, rng)
+    raise ValueError("unknown network type %r" % kind)
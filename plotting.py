@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Optional plots of ABM of environmental migration outputs. The model
+ modules never import matplotlib; it is only loaded when one of these
+ functions is called.
+
+@author: kelseabest
+"""
+
+def _pyplot():
+    try:
+        import matplotlib.pyplot as plt
+    except ImportError:
+        raise ImportError("plotting needs matplotlib (pip install matplotlib)")
+    return plt
+
+def _axes(ax):
+    if ax is None:
+        fig, ax = _pyplot().subplots()
+    return ax
+
+def plot_migrations(migrations, ax=None):
+    #total migrations per tick, one line per replicate if there is a replicate column
+    ax = _axes(ax)
+    if 'replicate' in migrations:
+        for r, m in migrations.groupby('replicate'):
+            ax.plot(m['tick'], m['total_mig'], color='grey', alpha=0.4)
+        mean = migrations.groupby('tick')['total_mig'].mean()
+        ax.plot(mean.index, mean.values, color='black', label='mean')
+        ax.legend()
+    else:
+        ax.plot(migrations['tick'], migrations['total_mig'])
+    ax.set_xlabel('tick')
+    ax.set_ylabel('households that sent a migrant')
+    return ax
+
+def plot_wealth(data_set, ticks=None, ax=None):
+    #household wealth distribution at the given ticks (default first and last)
+    ax = _axes(ax)
+    if ticks is None:
+        ticks = sorted({data_set['tick'].min(), data_set['tick'].max()})
+    for tick in ticks:
+        ax.hist(data_set.loc[data_set['tick'] == tick, 'wealth'], bins=30, alpha=0.5,
+                label='tick %d' % tick)
+    ax.set_xlabel('household wealth')
+    ax.set_ylabel('households')
+    ax.legend()
+    return ax
+
+def plot_sweep(table, x, y='total_mig', tick=None, ax=None):
+    #sweep outcome y against parameter x at one tick (default last), mean and replicates
+    ax = _axes(ax)
+    tick = table['tick'].max() if tick is None else tick
+    at_tick = table[table['tick'] == tick]
+    ax.scatter(at_tick[x], at_tick[y], color='grey', alpha=0.4, s=10)
+    mean = at_tick.groupby(x)[y].mean()
+    ax.plot(mean.index, mean.values, color='black', marker='o')
+    ax.set_xlabel(x)
+    ax.set_ylabel('%s at tick %s' % (y, tick))
+    return ax
+
+def save(ax, path): #write the figure holding ax
+    ax.figure.savefig(path, bbox_inches='tight')
+    _pyplot().close(ax.figure)
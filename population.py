@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bulk initialization of individuals and households for ABM
+ of environmental migration
+
+@author: kelseabest
+"""
+
+#import packages
+from agent_store import GENDER_CODES, code_of
+import numpy as np
+
+def bulk_populate(individual_set, hh_set, n_ind, n_hh, wealth_factor, ag_factor):
+    #same draws as Individual.__init__, Household.__init__, gather_members
+    #and assign_head, done for the whole population in one pass
+
+    #individuals: Weibull ages, equal chance M/F
+    rng = individual_set.rng
+    age = rng.weibull(1.68, n_ind) * 33.6
+    gender = rng.integers(0, len(GENDER_CODES), n_ind)
+    ind_rows = individual_set.add_many(n_ind, age=age, gender=gender, ag_factor=ag_factor)
+
+    #households: normal wealth, Poisson size (at least 1), lognormal land
+    rng = hh_set.rng
+    wealth = rng.normal(wealth_factor, wealth_factor / 5, n_hh)
+    hh_size = np.maximum(rng.poisson(5.13, n_hh), 1)
+    land_owned = rng.lognormal(4.2, 1, n_hh)
+    hh_rows = hh_set.add_many(n_hh, wealth=wealth, hh_size=hh_size, land_owned=land_owned,
+                              wellbeing_threshold=hh_size * 20000, #world bank poverty threshold
+                              expenses=hh_size * 20000, #$$ to sustain HH (same as threshold)
+                              ag_factor=ag_factor,
+                              land_prod=ag_factor * land_owned) #productivity from own land
+
+    #members: households fill in order from one random permutation until
+    #individuals run out, like sequential gather_members calls
+    ends = np.minimum(np.cumsum(hh_size), n_ind)
+    n_assigned = ends[-1] if n_hh > 0 else 0
+    perm = ind_rows[rng.permutation(n_ind)[:n_assigned]]
+    member_hh = np.repeat(hh_set.id[hh_rows], np.diff(np.concatenate(([0], ends))))
+    individual_set.hh[perm] = member_hh
+
+    assign_heads(individual_set, hh_set, perm)
+    individual_set.version += 1
+
+def assign_heads(individual_set, hh_set, rows):
+    #heads: oldest male, else oldest female, of the households of the given
+    #member rows (all members of each), via one grouped argmax
+    if len(rows) == 0:
+        return
+    member_hh = individual_set.hh[rows]
+    is_male = individual_set.gender[rows] == code_of(GENDER_CODES, 'M')
+    order = np.lexsort((individual_set.age[rows], is_male, member_hh))
+    last = np.ones(len(rows), dtype=bool)
+    last[:-1] = member_hh[order][1:] != member_hh[order][:-1]
+    heads = rows[order][last]
+    individual_set.head[heads] = True
+    hh_set.head[hh_set.rows(individual_set.hh[heads])] = individual_set.id[heads]
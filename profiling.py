@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Optional per-phase timing and hot-path counters for ABM of
+ environmental migration. ABM_Model only touches this when built
+ with instrument=True, so a plain run pays one attribute check per
+ step.
+
+@author: kelseabest
+"""
+
+#import packages
+import time
+import pandas as pd
+
+#counters copied from ABM_Model.auction_stats after each step
+AUCTION_COUNTERS = ['looking', 'employers', 'matches', 'rounds', 'unskilled', 'skilled']
+
+class phase_profiler :
+    def __init__(self, profile_ticks=None, profiler='cprofile'):
+        self.rows = [] #one dict per tick
+        self.row = None
+        self.profile_ticks = profile_ticks #(first, last) ticks to run under a profiler
+        self.profiler_name = profiler #"cprofile" or "pyinstrument"
+        self.profiler = None
+
+    def __getstate__(self): #live profilers can not be pickled (checkpoints, forks)
+        state = dict(self.__dict__)
+        state['profiler'] = None
+        return state
+
+    def _row(self, tick):
+        if self.row is None or self.row['tick'] != tick:
+            self.row = {'tick': tick}
+            self.rows.append(self.row)
+        return self.row
+
+    def _profiling(self, tick):
+        return self.profile_ticks is not None and self.profile_ticks[0] <= tick <= self.profile_ticks[1]
+
+    def _start_profiler(self):
+        if self.profiler is None:
+            if self.profiler_name == 'pyinstrument':
+                try:
+                    from pyinstrument import Profiler
+                except ImportError:
+                    raise ImportError("profiler='pyinstrument' needs pyinstrument (pip install pyinstrument)")
+                self.profiler = Profiler()
+            else:
+                import cProfile
+                self.profiler = cProfile.Profile()
+        if self.profiler_name == 'pyinstrument':
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def _stop_profiler(self):
+        if self.profiler_name == 'pyinstrument':
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def run(self, tick, name, fn): #time one phase, adding to this tick's row
+        row = self._row(tick)
+        profiling = self._profiling(tick)
+        if profiling:
+            self._start_profiler()
+        t = time.perf_counter()
+        result = fn()
+        row['t_' + name] = row.get('t_' + name, 0.0) + time.perf_counter() - t
+        if profiling:
+            self._stop_profiler()
+        return result
+
+    def step(self, model): #one instrumented model_step
+        tick = model.tick
+        migrated_before = model.hh_set.someone_migrated.sum()
+        self.run(tick, 'shock', model.step_shock)
+        self.run(tick, 'land_hire', model.step_land)
+        self.run(tick, 'find_work', model.step_work)
+        self.run(tick, 'auction', model.double_auction)
+        self.run(tick, 'decide', model.step_decide)
+        row = self._row(tick)
+        for name in AUCTION_COUNTERS:
+            row[name] = model.auction_stats.get(name, 0)
+        row['migrations'] = model.hh_set.someone_migrated.sum() - migrated_before
+        row['impacted'] = model.origin_comm.impacted
+
+    def table(self): #per tick timings (seconds) and counters
+        table = pd.DataFrame(self.rows)
+        times = [c for c in table.columns if c.startswith('t_')]
+        if times:
+            table['t_total'] = table[times].sum(axis=1)
+        return table
+
+    def dump(self, path): #write the profiled tick range, pstats file or pyinstrument html
+        if self.profiler is None:
+            raise RuntimeError("no ticks were profiled, set profile_ticks")
+        if self.profiler_name == 'pyinstrument':
+            with open(path, 'w') as f:
+                f.write(self.profiler.output_html())
+        else:
+            self.profiler.dump_stats(path)
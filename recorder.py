@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar recorder for household level output of ABM
+ of environmental migration. Replaces the growing data_set DataFrame
+ with preallocated per tick buffers that are flushed in chunks to an
+ Arrow IPC or Parquet file and/or kept in memory.
+
+@author: kelseabest
+"""
+
+#import packages
+import numpy as np
+import pandas as pd
+
+#same columns as ABM_Model.data_collect
+COLUMNS = {'hh_id': np.int64, 'migrations': np.int64, 'wealth': np.float64,
+           'num_shocked': np.int64, 'wtp': np.float64, 'wta': np.float64,
+           'found_work': np.int64, 'tick': np.int64, 'ag_fac': np.float64,
+           'mig_util': np.float64, 'mig_threshold': np.float64, 'comm_scale': np.float64}
+
+def _arrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("writing recordings to file needs pyarrow (pip install pyarrow)")
+    return pyarrow
+
+class tick_recorder :
+    def __init__(self, path=None, file_format='arrow', keep=None, chunk_ticks=16):
+        self.path = path #output file, None to only keep in memory
+        self.file_format = file_format #"arrow" (IPC, memory mappable) or "parquet"
+        self.keep = (path is None) if keep is None else keep #hold chunks in memory
+        self.chunk_ticks = chunk_ticks #ticks buffered before a flush
+        self.buffers = None
+        self.n_rows = 0 #rows filled in the current chunk
+        self.chunks = [] #kept chunks, dicts of column arrays
+        self.writer = None
+        self.closed = False #the file is finished, further records would truncate it
+        self.mig_ticks = []
+        self.mig_totals = []
+
+    def _allocate(self, n_hh):
+        self.buffers = {name: np.empty(self.chunk_ticks * n_hh, dtype=dtype)
+                        for name, dtype in COLUMNS.items()}
+        self.n_rows = 0
+
+    def record(self, model): #one tick of household data
+        if self.closed:
+            raise RuntimeError("recording to %s was closed (by close() or reading data_set "
+                               "without keep), record into a new tick_recorder" % self.path)
+        hh = model.hh_set
+        live = hh.live_rows() #households that exist, see demography
+        n = hh.n_alive
+        if self.buffers is None or self.n_rows + n > len(self.buffers['hh_id']):
+            self.flush()
+            if self.buffers is None or n * self.chunk_ticks > len(self.buffers['hh_id']):
+                self._allocate(n)
+        rows = slice(self.n_rows, self.n_rows + n)
+        b = self.buffers
+        b['hh_id'][rows] = hh.id[live]
+        b['migrations'][rows] = hh.someone_migrated[live]
+        b['wealth'][rows] = hh.wealth[live]
+        b['num_shocked'][rows] = hh.num_shocked[live]
+        b['wtp'][rows] = hh.wtp[live]
+        b['wta'][rows] = hh.wta[live]
+        b['found_work'][rows] = model.got_job
+        b['tick'][rows] = model.tick
+        b['ag_fac'][rows] = model.ag_factor
+        b['mig_util'][rows] = model.mig_util
+        b['mig_threshold'][rows] = model.mig_threshold
+        b['comm_scale'][rows] = model.comm_scale
+        self.n_rows += n
+
+        #per tick aggregate straight from the columns
+        self.mig_ticks.append(model.tick)
+        self.mig_totals.append(hh.someone_migrated[live].sum())
+
+    def flush(self): #write out (and/or keep) the filled part of the chunk
+        if self.buffers is None or self.n_rows == 0:
+            return
+        chunk = {name: arr[:self.n_rows] for name, arr in self.buffers.items()}
+        if self.path is not None:
+            self._write(chunk)
+        if self.keep:
+            self.chunks.append({name: arr.copy() for name, arr in chunk.items()})
+        self.n_rows = 0
+
+    def _write(self, chunk):
+        pa = _arrow()
+        table = pa.table(chunk)
+        if self.writer is None:
+            if self.file_format == 'parquet':
+                import pyarrow.parquet as pq
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                self.writer = pa.ipc.new_file(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.closed = True
+
+    @property
+    def data_set(self): #household panel as a DataFrame
+        self.flush()
+        if self.keep:
+            if not self.chunks:
+                return pd.DataFrame(columns=list(COLUMNS))
+            return pd.DataFrame({name: np.concatenate([c[name] for c in self.chunks])
+                                 for name in COLUMNS})
+        self.close() #Arrow and Parquet files are only readable once finished
+        return open_recording(self.path, self.file_format).to_pandas()
+
+    @property
+    def migrations(self): #total migrations per tick
+        return pd.DataFrame({'tick': np.array(self.mig_ticks, dtype=np.int64),
+                             'total_mig': np.array(self.mig_totals, dtype=np.int64)})
+
+def open_recording(path, file_format='arrow'):
+    #read a recording as a pyarrow Table, Arrow IPC files are memory mapped
+    pa = _arrow()
+    if file_format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_table(path, memory_map=True)
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
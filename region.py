@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regional ABM of environmental migration with many communities.
+Each community is its own ABM_Model (own households, n_jobs,
+comm_impact and shock process). Communities are partitioned across
+worker processes that step them in parallel. Migrant and labor flows
+between communities are exchanged at tick boundaries by the
+coordinator, in community order, so the outputs do not depend on
+the number of partitions.
+
+@author: kelseabest
+"""
+
+#import packages
+import multiprocessing as mp
+import numpy as np
+import pandas as pd
+from agent_store import EMPLOYMENT_CODES, code_of
+from sweep import DEFAULTS, make_model
+
+LOOKING = code_of(EMPLOYMENT_CODES, 'Looking')
+
+class community_partition :
+    #the communities one worker owns, keyed by community id
+    def __init__(self, specs):
+        self.models = {cid: make_model(params, seed) for cid, params, seed in specs}
+        self.stepped = False
+
+    def step(self, adjustments):
+        #apply job adjustments from the last exchange, run one tick, report
+        reports = []
+        for cid, m in self.models.items():
+            if self.stepped:
+                m.job_adjustment = adjustments.get(cid, 0.0)
+                m.tick_up()
+            migrated_before = m.hh_set.someone_migrated.sum()
+            m.model_step()
+            stats = m.auction_stats
+            placed = stats.get('unskilled', 0) + stats.get('skilled', 0)
+            reports.append({'community': cid, 'tick': m.tick,
+                            'migrants': int(m.hh_set.someone_migrated.sum() - migrated_before),
+                            'total_mig': int(m.hh_set.someone_migrated.sum()),
+                            'mean_wealth': float(m.hh_set.wealth[m.hh_set.live_rows()].mean())
+                                           if m.hh_set.n_alive else 0.0,
+                            'impacted': bool(m.origin_comm.impacted),
+                            'avail_jobs': float(m.origin_comm.avail_jobs),
+                            'spare_jobs': max(float(m.origin_comm.avail_jobs) - placed, 0.0),
+                            'unplaced': int((m.individual_set.employment == LOOKING).sum()),
+                            'matches': stats.get('matches', 0)})
+        self.stepped = True
+        return reports
+
+def _partition_worker(conn, specs): #worker process loop, one partition
+    part = community_partition(specs)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        conn.send(part.step(message))
+    conn.close()
+
+def destination_weights(jobs_avail):
+    #migrants from c go to d != c in proportion to d's jobs (row stochastic)
+    w = np.tile(np.asarray(jobs_avail, dtype=float), (len(jobs_avail), 1))
+    np.fill_diagonal(w, 0)
+    totals = w.sum(axis=1, keepdims=True)
+    return np.divide(w, totals, out=np.zeros_like(w), where=totals > 0)
+
+def exchange(reports, weights):
+    #flows for the next tick from this tick's reports (ordered by community):
+    #in-migrants compete for local non-ag jobs, spare jobs elsewhere are
+    #shared among communities in proportion to their unplaced workers
+    migrants = np.array([r['migrants'] for r in reports], dtype=float)
+    spare = np.array([r['spare_jobs'] for r in reports])
+    unplaced = np.array([r['unplaced'] for r in reports], dtype=float)
+    inflow = weights.T @ migrants
+    others = unplaced.sum() - unplaced #unplaced workers outside each offering community
+    share = np.divide(np.outer(np.ones(len(spare)), unplaced), others[:, None],
+                      out=np.zeros((len(spare), len(spare))), where=others[:, None] > 0)
+    np.fill_diagonal(share, 0)
+    commute = share.T @ spare
+    return inflow, commute
+
+class regional_model :
+    def __init__(self, communities, seed=0, partitions=1, processes=True):
+        #communities: list of ABM_Model parameter dicts (see sweep.DEFAULTS)
+        #partitions: number of groups of communities stepped in parallel
+        #processes: False steps every partition in this process
+        self.communities = communities
+        seeds = np.random.SeedSequence(seed).spawn(len(communities))
+        specs = [(cid, params, seeds[cid]) for cid, params in enumerate(communities)]
+        groups = [specs[k::partitions] for k in range(partitions)]
+        self.partitions = [g for g in groups if g]
+        self.weights = destination_weights([dict(DEFAULTS, **c)['jobs_avail'] for c in communities])
+        self.adjustments = {}
+        self.records = []
+        self.workers = []
+        if processes:
+            for specs in self.partitions:
+                parent, child = mp.Pipe()
+                proc = mp.Process(target=_partition_worker, args=(child, specs), daemon=True)
+                proc.start()
+                self.workers.append((proc, parent))
+        else:
+            self.local = [community_partition(specs) for specs in self.partitions]
+
+    def step(self):
+        if self.workers:
+            for proc, conn in self.workers:
+                conn.send(self.adjustments)
+            reports = [r for proc, conn in self.workers for r in conn.recv()]
+        else:
+            reports = [r for part in self.local for r in part.step(self.adjustments)]
+        reports.sort(key=lambda r: r['community'])
+
+        inflow, commute = exchange(reports, self.weights)
+        for r, i, c in zip(reports, inflow, commute):
+            r['inflow'] = i
+            r['commute_jobs'] = c
+        self.adjustments = {r['community']: c - i for r, i, c in zip(reports, inflow, commute)}
+        self.records.extend(reports)
+
+    def run(self, ticks):
+        for t in range(ticks):
+            self.step()
+        return self.results()
+
+    def results(self):
+        #(per community per tick table, regional totals per tick)
+        table = pd.DataFrame(self.records)
+        region = table.groupby('tick').agg(total_mig=('total_mig', 'sum'),
+                                           migrants=('migrants', 'sum'),
+                                           communities_impacted=('impacted', 'sum'),
+                                           unplaced=('unplaced', 'sum')).reset_index()
+        return table, region
+
+    def close(self):
+        for proc, conn in self.workers:
+            conn.send(None)
+            proc.join()
+        self.workers = []
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of model run outputs for ABM of environmental migration.
+Entries are keyed by a hash of the model arguments, the seed and the
+ model code version (a hash of the package's .py sources), so any code
+ change starts a fresh set of keys. Entries are written to a temporary
+ file and renamed into place, so concurrent workers never see a
+ partial entry, and are evicted least recently used first by total
+ size and/or age.
+
+Example:
+    cache = result_cache('.abm_cache', max_bytes=2e9, max_age=30 * 86400)
+    table = run_sweep(design, replicates=10, cache=cache)
+
+@author: kelseabest
+"""
+
+#import packages
+import glob
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+import numpy as np
+
+_code_version = None
+
+def code_version(): #hash of the model sources next to this file
+    global _code_version
+    if _code_version is None:
+        h = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for path in sorted(glob.glob(os.path.join(here, '*.py'))):
+            h.update(os.path.basename(path).encode())
+            with open(path, 'rb') as f:
+                h.update(f.read())
+        _code_version = h.hexdigest()
+    return _code_version
+
+def _plain(value): #numpy scalars in keys, anything else is not cacheable
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError("%r can not be part of a cache key" % (value,))
+
+def run_key(params, seed, **extra):
+    #hex key for one run, params must be plain (json) values and seed an int
+    if seed is None:
+        raise ValueError("runs without a seed are not reproducible and can not be cached")
+    payload = json.dumps({'params': params, 'seed': seed, 'extra': extra,
+                          'code': code_version()}, sort_keys=True, default=_plain)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+class result_cache :
+    def __init__(self, path='.abm_cache', max_bytes=None, max_age=None):
+        self.path = os.path.abspath(path)
+        self.max_bytes = max_bytes #evict least recently used entries above this total size
+        self.max_age = max_age #evict entries not used for this many seconds
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key + '.pkl')
+
+    def __contains__(self, key):
+        return os.path.exists(self._file(key))
+
+    def get(self, key): #cached value or None, a hit marks the entry as recently used
+        path = self._file(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (EOFError, pickle.UnpicklingError): #unreadable entry, drop it
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError: #evicted meanwhile by another process
+            pass
+        return value
+
+    def put(self, key, value):
+        path = self._file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path) #atomic, concurrent writers of one key race harmlessly
+        except BaseException:
+            self._remove(tmp)
+            raise
+        if self.max_bytes is not None or self.max_age is not None:
+            self.evict()
+
+    def entries(self): #[(path, bytes, last used)] oldest first
+        out = []
+        for path in glob.glob(os.path.join(self.path, '??', '*.pkl')):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            out.append((path, st.st_size, st.st_mtime))
+        return sorted(out, key=lambda e: e[2])
+
+    def evict(self, max_bytes=None, max_age=None): #returns the number of entries removed
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_age = self.max_age if max_age is None else max_age
+        entries = self.entries()
+        total = sum(size for path, size, used in entries)
+        removed = 0
+        now = time.time()
+        for path, size, used in entries:
+            too_old = max_age is not None and now - used > max_age
+            too_big = max_bytes is not None and total > max_bytes
+            if not (too_old or too_big):
+                continue
+            self._remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for path, size, used in self.entries():
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
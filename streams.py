@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-model random number streams for ABM of environmental migration.
+Each model owns a SeedSequence and hands a child Generator to every
+component, so runs are reproducible from one seed without touching
+the global random / np.random state.
+
+@author: kelseabest
+"""
+
+#import packages
+import numpy as np
+
+#components that get their own stream, spawned in this order
+STREAMS = ['init', 'schedule', 'community', 'households', 'individuals', 'auction',
+           'network', 'demography']
+
+def model_streams(seed=None):
+    #returns (SeedSequence, {stream name: Generator}), seed=None draws fresh entropy
+    seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    children = seed_seq.spawn(len(STREAMS))
+    return seed_seq, {name: np.random.default_rng(c) for name, c in zip(STREAMS, children)}
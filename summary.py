@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Summary statistics output mode for ABM of environmental migration.
+Instead of the household panel, summary_recorder keeps one row of
+ aggregates per tick (migrations, wealth moments and quantiles, share
+ shocked, jobs found), so memory grows with ticks only, not with the
+ population. Wealth moments use mergeable Welford/Chan accumulators
+ and quantiles a log-bucket sketch with bounded relative error, so
+ summaries of chunks, replicates or communities can be combined.
+
+Example:
+    m = ABM_Model(..., recorder='summary')
+    summary, migrations = m.run()
+
+@author: kelseabest
+"""
+
+#import packages
+import math
+import numpy as np
+import pandas as pd
+
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+class running_moments :
+    #count, mean and sum of squared deviations (Welford, merged with Chan's
+    #formula), min and max of a stream of values
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values): #a batch of values
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return self
+        mean = values.mean()
+        self._combine(len(values), mean, float(((values - mean) ** 2).sum()),
+                      values.min(), values.max())
+        return self
+
+    def merge(self, other):
+        if other.n > 0:
+            self._combine(other.n, other.mean, other.m2, other.min, other.max)
+        return self
+
+    def _combine(self, n, mean, m2, lo, hi):
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.n * n / total
+        self.n = total
+        self.min = min(self.min, float(lo))
+        self.max = max(self.max, float(hi))
+
+    @property
+    def variance(self): #population variance, as np.var
+        return self.m2 / self.n if self.n else math.nan
+
+class log_sketch :
+    #quantile sketch for non-negative values: bucket k counts values in
+    #(gamma**(k - 1), gamma**k], zero and below share one bucket; any
+    #quantile is within relative_accuracy of a true value
+    def __init__(self, relative_accuracy=0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.zeros = 0
+        self.offset = 0 #key of counts[0]
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        positive = values[values > 0]
+        self.zeros += len(values) - len(positive)
+        if len(positive):
+            keys = np.ceil(np.log(positive) / self.log_gamma).astype(np.int64)
+            lo = keys.min()
+            self._add_counts(lo, np.bincount(keys - lo))
+        return self
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("can only merge sketches with the same relative accuracy")
+        self.zeros += other.zeros
+        if len(other.counts):
+            self._add_counts(other.offset, other.counts)
+        return self
+
+    def _add_counts(self, lo, counts):
+        if len(self.counts) == 0:
+            self.offset, self.counts = lo, counts.astype(np.int64)
+            return
+        start = min(self.offset, lo)
+        end = max(self.offset + len(self.counts), lo + len(counts))
+        merged = np.zeros(end - start, dtype=np.int64)
+        merged[self.offset - start:self.offset - start + len(self.counts)] += self.counts
+        merged[lo - start:lo - start + len(counts)] += counts
+        self.offset, self.counts = start, merged
+
+    @property
+    def count(self):
+        return self.zeros + int(self.counts.sum())
+
+    def quantile(self, q): #estimate for each q in [0, 1]
+        q = np.atleast_1d(np.asarray(q, dtype=np.float64))
+        if self.count == 0:
+            return np.full(len(q), math.nan)
+        rank = q * (self.count - 1)
+        out = np.zeros(len(q))
+        above = rank >= self.zeros
+        idx = np.searchsorted(np.cumsum(self.counts), rank[above] - self.zeros, side='right')
+        out[above] = 2 * self.gamma ** (self.offset + idx) / (self.gamma + 1)
+        return out
+
+class summary_recorder :
+    def __init__(self, quantiles=QUANTILES, relative_accuracy=0.01):
+        self.path = None #nothing is written to file, see tick_recorder
+        self.writer = None
+        self.quantiles = list(quantiles)
+        self.relative_accuracy = relative_accuracy
+        self.rows = [] #one dict of aggregates per tick
+        self.last_jobs = 0 #running total at the previous record
+
+    def record(self, model): #one tick of aggregates
+        hh = model.hh_set
+        live = hh.live_rows() #households that exist, see demography
+        n = hh.n_alive
+        wealth = running_moments().add(hh.wealth[live])
+        sketch = log_sketch(self.relative_accuracy).add(hh.wealth[live])
+        total_mig = int(hh.someone_migrated[live].sum())
+        #this tick's events are counted as they happen, totals over live
+        #households drop when a household dissolves (demography)
+        row = {'tick': model.tick, 'households': n, 'population': model.individual_set.n_alive,
+               'total_mig': total_mig, 'new_mig': hh.new_migrants,
+               'hh_with_migrant': int((hh.someone_migrated > 0).sum()),
+               'wealth_mean': wealth.mean, 'wealth_var': wealth.variance,
+               'wealth_min': wealth.min, 'wealth_max': wealth.max}
+        for q, value in zip(self.quantiles, sketch.quantile(self.quantiles)):
+            row['wealth_q%g' % (100 * q)] = value
+        row.update({'share_shocked': hh.shocks / n if n else 0.0,
+                    'found_work': model.got_job, 'new_jobs': model.got_job - self.last_jobs})
+        self.rows.append(row)
+        self.last_jobs = model.got_job
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    @property
+    def data_set(self): #per tick summary table, stands in for the household panel
+        return pd.DataFrame(self.rows)
+
+    @property
+    def migrations(self): #total migrations per tick
+        return pd.DataFrame({'tick': np.array([r['tick'] for r in self.rows], dtype=np.int64),
+                             'total_mig': np.array([r['total_mig'] for r in self.rows],
+                                                   dtype=np.int64)})
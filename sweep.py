@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Parameter sweeps and stochastic replicates for ABM
+ of environmental migration, run over a process pool.
+
+Example:
+    python sweep.py --grid mig_threshold=10000,50000 comm_scale=0.2,0.5 \
+        --replicates 10 --processes 4 --out sweep.csv
+    python sweep.py --grid mig_threshold=50000,1e9 --set ticks=50 \
+        --converge window=3 rtol=0.01 measures=total_mig,employment
+
+@author: kelseabest
+"""
+
+#import packages
+import argparse
+import itertools
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+import pandas as pd
+
+#ABM_Model arguments, used for anything a design does not set
+DEFAULTS = {'ticks': 10, 'N_hh': 100, 'N_ind': 500, 'decision': 'utility',
+            'mig_util': 30000, 'mig_threshold': 50000, 'wealth_factor': 200000,
+            'ag_factor': 300, 'comm_scale': 0.5, 'shock_method': 'shock',
+            'jobs_avail': 50, 'engine': 'vector', 'auction': 'sorted'}
+
+def param_grid(**values): #every combination, e.g. param_grid(mig_util=[1, 2], comm_scale=[.2, .5])
+    names = list(values)
+    return [dict(zip(names, combo)) for combo in itertools.product(*values.values())]
+
+def latin_hypercube(ranges, n, seed=0):
+    #n parameter sets, (low, high) tuples are sampled continuously,
+    #lists are treated as categories spread evenly over the strata
+    rng = np.random.default_rng(seed)
+    design = [{} for i in range(n)]
+    for name, spec in ranges.items():
+        strata = (rng.permutation(n) + rng.random(n)) / n
+        for d, u in zip(design, strata):
+            if isinstance(spec, tuple):
+                d[name] = float(spec[0] + u * (spec[1] - spec[0]))
+            else:
+                d[name] = spec[int(u * len(spec))]
+    return design
+
+def task_seed(seed, set_id, replicate): #independent stream per (set, replicate)
+    return int(np.random.SeedSequence([seed, set_id, replicate]).generate_state(1)[0])
+
+#positional ABM_Model arguments, in order, anything else is passed by keyword
+POSITIONAL = ['ticks', 'N_hh', 'N_ind', 'decision', 'mig_util', 'mig_threshold',
+              'wealth_factor', 'ag_factor', 'comm_scale', 'shock_method', 'jobs_avail']
+
+def make_model(params, seed): #ABM_Model from a parameter dict, DEFAULTS fill the rest
+    #every task builds its own model: the population is drawn from the task's
+    #seed, so reusing a built one would correlate replicates. What a worker
+    #reuses is its imported modules and, across chunks, the process itself.
+    from ABM_model_steps import ABM_Model
+    p = dict(DEFAULTS, **params)
+    return ABM_Model(*[p.pop(k) for k in POSITIONAL], seed=seed, **p)
+
+def run_outputs(params, seed, converge=None, cache=None):
+    #(data_set, migrations, stop summary or None) of one run, read from
+    #cache (a result_cache) when this run has been done before
+    key = None
+    if cache is not None:
+        from result_cache import run_key
+        key = run_key(dict(DEFAULTS, **params), seed, converge=converge)
+        hit = cache.get(key)
+        if hit is not None:
+            return hit
+    m = make_model(params, seed)
+    monitor = None
+    if converge is not None:
+        from convergence import convergence_monitor
+        monitor = convergence_monitor(**converge)
+    data_set, migrations = m.run(monitor)
+    outputs = (data_set, migrations, None if monitor is None else monitor.summary())
+    if cache is not None:
+        cache.put(key, outputs)
+    return outputs
+
+def summarize(data_set, migrations, stop=None): #per tick summary of one run
+    if 'wealth_mean' in data_set: #recorder='summary' output is already per tick
+        summary = data_set[['tick', 'wealth_mean', 'found_work']].rename(
+            columns={'wealth_mean': 'mean_wealth'})
+    else:
+        summary = data_set.groupby('tick').agg(mean_wealth=('wealth', 'mean'),
+                                               found_work=('found_work', 'max')).reset_index()
+    result = migrations.reset_index(drop=True).merge(summary, on='tick')
+    if stop is not None:
+        result = result.assign(**stop)
+    return result
+
+def run_model(params, seed, converge=None, cache=None):
+    #one run, per tick summary as a DataFrame; converge is a dict of
+    #convergence_monitor arguments to stop runs early once they settle
+    return summarize(*run_outputs(params, seed, converge, cache))
+
+def run_chunk(chunk, seed, converge=None, cache=None): #worker entry, python errors are returned not raised
+    out = []
+    for set_id, params, replicate in chunk:
+        try:
+            result = run_model(params, task_seed(seed, set_id, replicate), converge, cache)
+            error = None
+        except Exception:
+            result, error = None, traceback.format_exc()
+        out.append((set_id, params, replicate, result, error))
+    return out
+
+def _run_chunks(chunks, seed, processes, converge=None, cache=None):
+    #returns (finished results, chunks lost to a crashed worker)
+    if processes == 1:
+        return [r for c in chunks for r in run_chunk(c, seed, converge, cache)], []
+    done, lost = [], []
+    with ProcessPoolExecutor(processes) as pool: #workers stay up across chunks
+        futures = {pool.submit(run_chunk, c, seed, converge, cache): c for c in chunks}
+        for f in as_completed(futures):
+            try:
+                done.extend(f.result())
+            except BrokenProcessPool:
+                lost.append(futures[f])
+    return done, lost
+
+def _run_isolated(task, seed, converge=None, cache=None): #own single use worker, so a crash only loses this task
+    set_id, params, replicate = task
+    with ProcessPoolExecutor(1) as pool:
+        try:
+            return pool.submit(run_chunk, [task], seed, converge, cache).result()
+        except BrokenProcessPool:
+            return [(set_id, params, replicate, None, 'worker process crashed')]
+
+def _cached_tasks(tasks, seed, converge, cache): #(finished results, tasks still to run)
+    from result_cache import run_key
+    finished, missing = [], []
+    for set_id, params, replicate in tasks:
+        key = run_key(dict(DEFAULTS, **params), task_seed(seed, set_id, replicate),
+                      converge=converge)
+        hit = cache.get(key)
+        if hit is None:
+            missing.append((set_id, params, replicate))
+        else:
+            finished.append((set_id, params, replicate, summarize(*hit), None))
+    return finished, missing
+
+def run_sweep(design, replicates=1, processes=None, chunksize=4, seed=0, max_retries=2,
+              converge=None, cache=None):
+    #run every parameter set in design replicates times, returns one tidy
+    #table keyed by set_id and replicate (failed runs have an error and no ticks)
+    #converge: convergence_monitor arguments, adds stop_reason and stop_tick
+    #cache: result_cache, only runs missing from it are computed (and added)
+    tasks = [(set_id, params, r) for set_id, params in enumerate(design) for r in range(replicates)]
+    finished = []
+    if cache is not None:
+        finished, tasks = _cached_tasks(tasks, seed, converge, cache)
+    pending = [tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize)]
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        done, lost = _run_chunks(pending, seed, processes, converge, cache)
+        finished.extend(done)
+        #finished chunks are kept, crashed ones are retried a task at a time
+        pending = [[t] for c in lost for t in c]
+    for task in (t for c in pending for t in c):
+        finished.extend(_run_isolated(task, seed, converge, cache))
+
+    tables = []
+    for set_id, params, replicate, result, error in sorted(finished, key=lambda f: (f[0], f[2])):
+        if result is None:
+            result = pd.DataFrame({'tick': [np.nan]})
+        result = result.assign(set_id=set_id, replicate=replicate, error=error, **params)
+        tables.append(result)
+    table = pd.concat(tables, ignore_index=True)
+    keys = ['set_id', 'replicate'] + list(dict.fromkeys(k for p in design for k in p))
+    return table[keys + [c for c in table.columns if c not in keys]]
+
+def _parse_value(text):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parameter sweep of the migration ABM")
+    parser.add_argument('--grid', nargs='*', default=[], metavar='NAME=V1,V2',
+                        help="grid values per parameter")
+    parser.add_argument('--lhs', nargs='*', default=[], metavar='NAME=LOW,HIGH',
+                        help="latin hypercube ranges per parameter")
+    parser.add_argument('--samples', type=int, default=10, help="latin hypercube sets")
+    parser.add_argument('--replicates', type=int, default=1)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--chunksize', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--set', nargs='*', default=[], metavar='NAME=VALUE',
+                        help="fixed model arguments")
+    parser.add_argument('--converge', nargs='*', default=None, metavar='NAME=VALUE',
+                        help="stop runs early once settled, convergence_monitor arguments "
+                             "(e.g. window=3 rtol=0.01 measures=total_mig,employment)")
+    parser.add_argument('--cache', default=None, metavar='DIR',
+                        help="reuse and store run outputs in this result cache directory")
+    parser.add_argument('--cache-max-bytes', type=float, default=None)
+    parser.add_argument('--cache-max-age', type=float, default=None, help="seconds")
+    parser.add_argument('--out', default='sweep.csv')
+    args = parser.parse_args(argv)
+
+    fixed = {k: _parse_value(v) for k, v in (s.split('=', 1) for s in args.set)}
+    if args.lhs:
+        ranges = {}
+        for spec in args.lhs:
+            name, bounds = spec.split('=', 1)
+            ranges[name] = tuple(float(b) for b in bounds.split(','))
+        design = latin_hypercube(ranges, args.samples, args.seed)
+    else:
+        design = param_grid(**{k: [_parse_value(v) for v in vals.split(',')]
+                               for k, vals in (g.split('=', 1) for g in args.grid)})
+    design = [dict(fixed, **d) for d in design]
+
+    converge = None
+    if args.converge is not None:
+        converge = {k: _parse_value(v) for k, v in (c.split('=', 1) for c in args.converge)}
+        if 'measures' in converge:
+            converge['measures'] = str(converge['measures']).split(',')
+    cache = None
+    if args.cache is not None:
+        from result_cache import result_cache
+        cache = result_cache(args.cache, args.cache_max_bytes, args.cache_max_age)
+    table = run_sweep(design, args.replicates, args.processes, args.chunksize, args.seed,
+                      converge=converge, cache=cache)
+    table.to_csv(args.out, index=False)
+    print("wrote %d rows for %d parameter sets to %s" % (len(table), len(design), args.out))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+#model modules live at the repository root
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from ABM_model_steps import ABM_Model
+
+@pytest.fixture
+def build_model():
+    #small vector engine model, each test picks size, seed and options
+    def build(ticks=8, N_hh=40, N_ind=220, seed=7, **kwargs):
+        kwargs.setdefault('engine', 'vector')
+        kwargs.setdefault('auction', 'sorted')
+        return ABM_Model(ticks, N_hh, N_ind, 'utility', 30000, 50000, 200000, 300, 0.5, 'shock', 50,
+                         seed=seed, **kwargs)
+    return build
+
+@pytest.fixture
+def run_ticks():
+    #step a model tick by tick, as ABM_Model.run does without reading results
+    def run(m, n):
+        for t in range(n):
+            m.model_step()
+            m.data_collect()
+            m.tick_up()
+    return run
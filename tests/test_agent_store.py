@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the columnar agent stores and the membership index
+
+@author: kelseabest
+"""
+
+#import packages
+import numpy as np
+import pytest
+from agent_store import household_store
+
+@pytest.mark.parametrize('demography', [None, True])
+def test_incremental_updates_match_full_recompute(build_model, run_ticks, demography):
+    m = build_model(validate_cache=True, demography=demography) #raises on any stale value
+    run_ticks(m, 8)
+    full = build_model(demography=demography)
+    full.individual_set.validate_cache = False
+    for t in range(8): #recompute everything every tick
+        full.individual_set.mark_recheck()
+        full.individual_set.touch(eligible=True)
+        full.model_step()
+        full.data_collect()
+        full.tick_up()
+    assert np.array_equal(m.data_set['wealth'], full.data_set['wealth'])
+
+def test_untouched_salary_change_is_caught(build_model, run_ticks):
+    m = build_model(validate_cache=True)
+    run_ticks(m, 2)
+    ind = m.individual_set
+    members = ind.members()
+    members.refresh() #take the migrants touched last tick
+    row = np.flatnonzero(ind.hh != 0)[0]
+    ind.salary[row] += 1000 #without ind.touch
+    with pytest.raises(RuntimeError):
+        members.refresh()
+
+def test_eligible_segments_update_in_place(build_model, run_ticks):
+    m = build_model()
+    run_ticks(m, 3)
+    ind = m.individual_set
+    members = ind.members()
+    members.refresh()
+    rows = members.eligible_rows[::3]
+    ind.migrated[rows] = True
+    ind.touch(rows, eligible=True)
+    members.refresh()
+    offsets, eligible = members.eligible_offsets.copy(), members.eligible_rows.copy()
+    members._eligible()
+    assert np.array_equal(offsets, members.eligible_offsets)
+    assert np.array_equal(eligible, members.eligible_rows)
+
+def test_secure_recovers_after_going_broke(build_model, run_ticks):
+    m = build_model(validate_cache=True) #raises on a stale secure
+    run_ticks(m, 2)
+    hh = m.hh_set
+    hh.wealth[:] = -1e9 #everyone broke at this tick's update_wealth
+    run_ticks(m, 1)
+    assert not hh.secure.any()
+    run_ticks(m, 1) #households whose members kept their salaries too
+    assert np.array_equal(hh.secure, hh.total_utility >= hh.wellbeing_threshold)
+
+def test_id_map_stays_bounded_under_churn():
+    store = household_store(50)
+    store.add_many(50)
+    for t in range(200): #the oldest tenth leave, as many arrive
+        live = store.live_rows()
+        ids = np.sort(store.id[live])
+        store.remove(store.rows(ids[:5]))
+        store.add_many(5)
+    assert store.next_uid - 1 == 1050 and len(store.row_of) <= 4 * 51
+    live = store.live_rows()
+    assert np.array_equal(store.rows(store.id[live]), np.arange(store.size)[live])
+    assert (store.rows([0, 1, 999]) == -1).all() #gone long ago
+    assert store.get(1) is None and store.get(int(store.id[live][0])) is not None
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for demographic dynamics on slot-reusing agent stores
+
+@author: kelseabest
+"""
+
+#import packages
+import numpy as np
+
+def test_population_turns_over_in_bounded_storage(build_model):
+    m = build_model(60, 100, 500, seed=5, demography=True)
+    m.run()
+    ind, hh = m.individual_set, m.hh_set
+    history = m.demography.history
+    assert sum(e['births'] for e in history) > 0 and sum(e['deaths'] for e in history) > 0
+    assert sum(e['dissolved'] for e in history) > 0
+    assert ind.next_uid - 1 > ind.size #ids outnumber rows, freed rows were reused
+    live = ind.live_rows()
+    assert np.array_equal(ind.rows(ind.id[live]), np.arange(ind.size)[live])
+    assert (hh.rows(ind.hh[ind.alive]) >= 0).all() #everyone lives in an existing household
+    assert (ind.rows(hh.head[hh.live_rows()]) >= 0).all() #and every household has a living head
+
+def test_summary_counts_this_ticks_events(build_model):
+    m = build_model(60, 100, 500, seed=5, demography=True, recorder='summary')
+    summary, migrations = m.run()
+    assert (summary['share_shocked'] >= 0).all()
+    assert (summary['new_mig'] >= 0).all()
+
+def test_freed_household_rows_lose_network_ties(build_model):
+    m = build_model(40, 100, 500, seed=5, demography=True, network='random')
+    m.run()
+    hh = m.hh_set
+    net = hh.network
+    assert m.demography.history and sum(e['dissolved'] for e in m.demography.history) > 0
+    freed = np.flatnonzero(hh.id[:net.n] == 0)
+    reused = np.flatnonzero(hh.id[:net.n] > m.num_hh) #households founded in freed rows
+    for row in np.concatenate((freed, reused)):
+        assert len(net.neighbors(row)) == 0
+    assert not np.isin(net.indices, np.concatenate((freed, reused))).any()
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the columnar tick recorder
+
+@author: kelseabest
+"""
+
+#import packages
+import pytest
+from recorder import tick_recorder
+
+def test_reading_kept_recording_does_not_stop_it(build_model, run_ticks, tmp_path):
+    recorder = tick_recorder(str(tmp_path / 'run.arrow'), keep=True, chunk_ticks=2)
+    m = build_model(6, 20, 100, seed=4, recorder=recorder)
+    run_ticks(m, 3)
+    assert sorted(m.results()[0]['tick'].unique()) == [0, 1, 2]
+    run_ticks(m, 3)
+    data_set, migrations = m.results()
+    assert sorted(data_set['tick'].unique()) == list(range(6))
+    assert list(migrations['tick']) == list(range(6))
+
+@pytest.mark.parametrize('file_format', ['arrow', 'parquet'])
+def test_record_after_reading_file_raises(build_model, run_ticks, tmp_path, file_format):
+    recorder = tick_recorder(str(tmp_path / 'run'), file_format=file_format, chunk_ticks=2)
+    m = build_model(6, 20, 100, seed=4, recorder=recorder)
+    run_ticks(m, 3)
+    assert sorted(m.results()[0]['tick'].unique()) == [0, 1, 2]
+    with pytest.raises(RuntimeError):
+        run_ticks(m, 1)
+    #the finished file was not truncated
+    assert sorted(m.results()[0]['tick'].unique()) == [0, 1, 2]
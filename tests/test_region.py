@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the partitioned regional model
+
+@author: kelseabest
+"""
+
+#import packages
+import pandas as pd
+from region import regional_model
+
+COMMUNITIES = [{'N_hh': 20, 'N_ind': 100, 'jobs_avail': jobs, 'shock_method': shock}
+               for jobs, shock in [(10, 'shock'), (40, 'slow_onset'), (25, 'shock'),
+                                   (60, 'shock'), (5, 'slow_onset')]]
+
+def test_outputs_do_not_depend_on_partitions():
+    single = regional_model(COMMUNITIES, seed=3, partitions=1, processes=False)
+    split = regional_model(COMMUNITIES, seed=3, partitions=3) #worker processes
+    try:
+        single.run(6)
+        split.run(6)
+    finally:
+        split.close()
+    for a, b in zip(single.results(), split.results()):
+        pd.testing.assert_frame_equal(a, b)
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for the whole-population step engine
+
+@author: kelseabest
+"""
+
+#import packages
+import numpy as np
+from vector_engine import compare_engines, salary_of
+
+#ticks, N_hh, N_ind, decision, mig_util, mig_threshold, wealth_factor, ag_factor,
+#comm_scale, shock_method, jobs_avail
+ARGS = (5, 30, 150, 'utility', 30000, 50000, 200000, 300, 0.5, 'shock', 50)
+
+def test_engines_equivalent():
+    table = compare_engines(ARGS, replicates=10, ticks=4)
+    assert len(table) == 8
+    assert table['equivalent'].all(), table
+
+def test_individuals_without_household_never_migrate(build_model, run_ticks):
+    #more individuals than household places leaves some with hh 0
+    m = build_model(5, 50, 600, seed=1, auction='random')
+    ind, hh = m.individual_set, m.hh_set
+    assert (ind.hh == 0).any()
+    run_ticks(m, 5)
+    assert not ind.migrated[ind.hh == 0].any()
+    #every household's count matches its own migrated members
+    sent = np.bincount(ind.hh[ind.migrated], minlength=hh.next_uid)
+    assert np.array_equal(hh.someone_migrated, sent[hh.id])
+
+def test_salary_of_skips_household_zero():
+    per_hh = np.array([5.0, 1.0, 2.0])
+    assert np.array_equal(salary_of(per_hh, np.array([0, 2, 7])), [0.0, 2.0, 0.0])
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Whole-population step engine for ABM of environmental migration.
+Runs each phase of ABM_Model.model_step as NumPy operations over the
+agent store columns instead of per-agent method calls.
+
+@author: kelseabest
+"""
+
+#import packages
+from agent_store import EMPLOYMENT_CODES, GENDER_CODES, code_of
+from decisions import get_decision
+import numpy as np
+import pandas as pd
+
+LOOKING = code_of(EMPLOYMENT_CODES, 'Looking')
+SELF_AG = code_of(EMPLOYMENT_CODES, 'SelfAg')
+NO_WORK = code_of(EMPLOYMENT_CODES, 'None')
+MALE = code_of(GENDER_CODES, 'M')
+
+def check_land(hh, community, comm_scale):
+    #same rule as Household.check_land with one batched draw per household
+    if community.impacted == True:
+        hit = (hh.rng.random(len(hh)) < comm_scale) & (hh.id != 0) #freed rows are not hit
+        hh.land_impacted[hit] = True
+        hh.num_shocked[hit] += 1
+        hh.shocks += int(hit.sum())
+        hh.wealth[hit] *= hh.rng.random(hit.sum())
+        hh.land_prod[hit] = 0
+
+def hire_employees(hh):
+    hh.num_employees[:] = np.where(hh.land_impacted, 0, np.round(hh.land_owned / 2))
+    hiring = hh.num_employees > 0
+    hh.wtp[:] = np.where(hiring, (hh.ag_factor * hh.land_owned) / (hh.num_employees + 1), 0)
+    hh.wta[:] = (hh.wellbeing_threshold / np.maximum(hh.hh_size, 1)) * hh.rng.random(len(hh))
+
+def check_eligibility(ind):
+    new = np.flatnonzero((ind.age >= 14) & (ind.gender == MALE) & ~ind.migrated & ~ind.can_migrate)
+    ind.can_migrate[new] = True
+    if len(new):
+        ind.touch(new, eligible=True)
+
+def find_work(ind, hh, mig_util, rows=None):
+    #rows: individuals to update, default everyone; returns the rows of
+    #them that are in the auction
+    if rows is None:
+        rows = np.flatnonzero(ind.hh != 0)
+    else:
+        rows = rows[ind.hh[rows] != 0]
+    hh_rows = hh.rows(ind.hh[rows])
+    checked, old_salary = rows, ind.salary[rows]
+
+    migrated = ind.migrated[rows]
+    ind.salary[rows[migrated]] = mig_util
+    #migrants keep their last employment, still looking ones stay in the auction
+    away = rows[migrated]
+    away = away[ind.employment[away] == LOOKING]
+    rows, hh_rows = rows[~migrated], hh_rows[~migrated]
+
+    #too young to work or not male
+    no_work = (ind.age[rows] < 14) | (ind.gender[rows] != MALE)
+    ind.employment[rows[no_work]] = NO_WORK
+    ind.salary[rows[no_work]] = 0
+    rows, hh_rows = rows[~no_work], hh_rows[~no_work]
+
+    #work in ag on own land
+    own_land = ~hh.land_impacted[hh_rows] & (hh.land_owned[hh_rows] > 100)
+    self_ag = rows[own_land]
+    ind.employment[self_ag] = SELF_AG
+    ind.salary[self_ag] = hh.land_owned[hh_rows[own_land]] * ind.ag_factor[self_ag] * 2
+
+    looking = rows[~own_land]
+    ind.employment[looking] = LOOKING
+    ind.wta[looking] = hh.wta[hh_rows[~own_land]]
+    ind.salary[looking] = 0
+    ind.touch(checked[ind.salary[checked] != old_salary])
+    return np.concatenate((looking, away))
+
+def pick_migrants(members, migrated, rng):
+    #one uniformly random eligible, not yet migrated member per household
+    #returns (household ids, individual rows)
+    rows = members.eligible_rows
+    hh_ids = np.repeat(np.arange(len(members.eligible_offsets) - 1),
+                       np.diff(members.eligible_offsets))
+    keep = ~migrated[rows] & (hh_ids != 0) #individuals without a household stay
+    rows, hh_ids = rows[keep], hh_ids[keep]
+    order = np.lexsort((rng.random(len(rows)), hh_ids))
+    rows, hh_ids = rows[order], hh_ids[order]
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = hh_ids[1:] != hh_ids[:-1]
+    return hh_ids[first], rows[first]
+
+def migrate(ind, hh, members, method, mig_util, mig_threshold, network_effect=0):
+    #one candidate per household, the decision method's mask picks who goes
+    decision = get_decision(method)
+    hh_ids, migrants = pick_migrants(members, ind.migrated, hh.rng)
+    hh_rows = hh.rows(hh_ids)
+    can_pay = hh.wealth[hh_rows] > mig_threshold
+    hh_rows, migrants = hh_rows[can_pay], migrants[can_pay]
+    hh.total_util_w_migrant[hh_rows] = (hh.total_utility[hh_rows] - ind.salary[migrants] + mig_util
+                                        + network_effect * hh.network_moves[hh_rows]) #migrant neighbors
+    go = decision.decide_batch(hh, hh_rows)
+    hh_rows, migrants = hh_rows[go], migrants[go]
+    hh.wealth[hh_rows] -= mig_threshold #subtract out mig_threshold cost
+    hh.someone_migrated[hh_rows] += 1
+    hh.new_migrants += len(hh_rows)
+    ind.migrated[migrants] = True
+    old_salary = ind.salary[migrants]
+    ind.salary[migrants] = mig_util
+    members.moved(migrants, hh.id[hh_rows], old_salary)
+
+def sum_utility(hh, members):
+    #total utility only changes for households a refresh marked dirty, secure
+    #is redone for all as update_wealth and resizing change it without a refresh
+    rows = members.take_dirty(hh)
+    hh.total_utility[rows] = salary_of(members.salary_sum, hh.id[rows])
+    hh.secure[:] = hh.total_utility >= hh.wellbeing_threshold
+    if members.individual_set.validate_cache:
+        members.validate(hh.total_utility, hh.id, hh.secure, hh.wellbeing_threshold)
+
+def update_wealth(hh, salary_sum):
+    hh.wealth[:] = hh.wealth + salary_sum - hh.expenses - hh.payments + hh.land_prod
+    broke = hh.wealth < 0
+    hh.wealth[broke] = 0
+    hh.secure[broke] = False
+    #reset these values
+    hh.land_impacted[:] = False
+    hh.land_prod[:] = hh.ag_factor * hh.land_owned
+    for a in hh.objects[:len(hh)]:
+        if a is not None and a.employees:
+            a.employees = []
+
+def vector_land(model): #households check land and set hiring
+    check_land(model.hh_set, model.origin_comm, model.comm_scale)
+    hire_employees(model.hh_set)
+
+def vector_work(model): #individuals update eligibility and look for work
+    ind, hh = model.individual_set, model.hh_set
+    check_eligibility(ind)
+    #only individuals whose work inputs changed: last tick's labor market, members
+    #of households whose land was hit, boys turning 14 and demographic changes
+    #(ind.mark_recheck), everyone else keeps their job and salary
+    ind.mark_recheck(hh_ids=hh.id[hh.land_impacted])
+    looking = find_work(ind, hh, model.mig_util, ind.take_recheck())
+    ind.mark_recheck(looking) #the labor market is rerun every tick
+    if ind.validate_cache:
+        validate_work(ind, hh, model.mig_util)
+
+def validate_work(ind, hh, mig_util):
+    #cross check the incremental find_work against one over everyone
+    incremental = [ind.employment.copy(), ind.salary.copy(), ind.wta.copy()]
+    find_work(ind, hh, mig_util)
+    for name, before in zip(['employment', 'salary', 'wta'], incremental):
+        bad = np.flatnonzero(getattr(ind, name) != before)
+        if len(bad):
+            raise RuntimeError("%s out of date for individual rows %s" % (name, bad[:10]))
+
+def vector_decide(model): #sum utility, send migrants, update wealth
+    ind, hh = model.individual_set, model.hh_set
+    model.update_network()
+    members = ind.members()
+    members.refresh()
+    sum_utility(hh, members)
+    migrate(ind, hh, members, model.decision, model.mig_util, model.mig_threshold,
+            model.network_effect)
+    update_wealth(hh, salary_of(members.salary_sum, hh.id))
+
+def vector_step(model):
+    model.step_shock()
+    vector_land(model)
+    vector_work(model)
+    model.double_auction()
+    vector_decide(model)
+
+def salary_of(per_hh_id, ids):
+    #index a per household id aggregate, ids past the end (and 0, freed
+    #rows) have no members
+    out = np.zeros(len(ids))
+    inside = (ids < len(per_hh_id)) & (ids != 0)
+    out[inside] = per_hh_id[ids[inside]]
+    return out
+
+def compare_engines(model_args, replicates=20, ticks=5, z_max=3.0):
+    #statistical equivalence of the 'agent' and 'vector' engines: runs both
+    #engines over replicates and compares per tick means of total migrations
+    #and mean wealth with a two sample z score
+    from ABM_model_steps import ABM_Model
+    results = []
+    for engine in ['agent', 'vector']:
+        for r in range(replicates):
+            m = ABM_Model(*model_args, engine=engine, seed=r)
+            for t in range(ticks):
+                m.model_step()
+                m.data_collect()
+                m.tick_up()
+            out = m.data_set.groupby('tick').agg(total_mig=('migrations', 'sum'),
+                                                 mean_wealth=('wealth', 'mean'))
+            out['engine'] = engine
+            out['replicate'] = r
+            results.append(out.reset_index())
+    results = pd.concat(results)
+
+    rows = []
+    for tick in range(ticks):
+        for measure in ['total_mig', 'mean_wealth']:
+            at_tick = results[results.tick == tick]
+            a = at_tick[at_tick.engine == 'agent'][measure]
+            v = at_tick[at_tick.engine == 'vector'][measure]
+            se = np.sqrt(a.var() / len(a) + v.var() / len(v))
+            z = 0.0 if se == 0 else (v.mean() - a.mean()) / se
+            rows.append({'tick': tick, 'measure': measure, 'agent_mean': a.mean(),
+                         'vector_mean': v.mean(), 'z': z, 'equivalent': abs(z) < z_max})
+    return pd.DataFrame(rows)